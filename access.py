@@ -0,0 +1,76 @@
+"""Contrôle d'accès : utilisateurs autorisés et rôles, rechargés à chaud depuis .env.
+
+Format dans .env :
+    ALLOWED_USER_ID=123456789                         # administrateur principal
+    ALLOWED_USERS=111:operator,222:readonly,333:admin  # autres utilisateurs
+"""
+
+import logging
+import os
+import time
+
+from dotenv import dotenv_values
+
+logger = logging.getLogger(__name__)
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_FILE = os.path.join(DIR, ".env")
+
+# Rôles par niveau croissant : un rôle inclut les droits des rôles inférieurs
+ROLES = {
+    "readonly": 0,  # Aide et consultation
+    "operator": 1,  # Sessions et messages à Claude
+    "admin": 2,  # Tout, y compris la vue sur les sessions des autres
+}
+DEFAULT_ROLE = "operator"
+RECHECK_INTERVAL = 2  # Secondes entre deux vérifications du mtime de .env
+
+_users: dict[int, str] = {}
+_stamp: tuple[int, int, int] | None = (-1, -1, -1)  # Force le premier chargement
+_checked_at = float("-inf")
+
+
+def parse_users(values: dict[str, str | None]) -> dict[int, str]:
+    """Construit la table user_id → rôle depuis les variables ALLOWED_*."""
+    users: dict[int, str] = {}
+    for entry in (values.get("ALLOWED_USERS") or "").split(","):
+        uid, _, role = entry.strip().partition(":")
+        role = role.strip() or DEFAULT_ROLE
+        if not uid.strip().isdigit() or role not in ROLES:
+            if entry.strip():
+                logger.warning("Entrée ALLOWED_USERS ignorée : %r", entry.strip())
+            continue
+        users[int(uid)] = role
+    admin = (values.get("ALLOWED_USER_ID") or "").strip()
+    if admin.isdigit() and int(admin):
+        users[int(admin)] = "admin"
+    return users
+
+
+def reload(force: bool = False):
+    """Relit .env si son mtime/inode a changé (vérifié au plus toutes les 2s)."""
+    global _users, _stamp, _checked_at
+    now = time.monotonic()
+    if not force and now - _checked_at < RECHECK_INTERVAL:
+        return
+    _checked_at = now
+    try:
+        st = os.stat(ENV_FILE)
+        stamp = (st.st_mtime_ns, st.st_ino, st.st_size)
+    except OSError:
+        stamp = None
+    if stamp == _stamp and not force:
+        return
+    _stamp = stamp
+    values = dotenv_values(ENV_FILE) if stamp else dict(os.environ)
+    _users = parse_users(values)
+
+
+def role_of(user_id: int) -> str | None:
+    """Rôle de l'utilisateur, ou None s'il n'est pas autorisé."""
+    reload()
+    return _users.get(user_id)
+
+
+def has_role(role: str | None, required: str) -> bool:
+    return role is not None and ROLES[role] >= ROLES[required]
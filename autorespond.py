@@ -0,0 +1,259 @@
+"""Réponse automatique aux dialogues de permission, d'après les règles des settings.
+
+Un dialogue détecté par `parse_screen` est classé (outil, commande ou fichier)
+puis confronté aux règles allow/deny de .claude/settings.local.json — celles
+que gèrent `telebot settings` (règles Bash, presets) :
+- tout est couvert par une règle allow → « Yes » envoyé immédiatement
+- une règle deny correspond → refus (Escape)
+- sinon, ou en cas de doute → dialogue transmis sur Telegram comme avant
+Sont toujours transmis : substitutions et redirections shell, fichiers hors du
+répertoire de travail. Désactivé par défaut (Paramètres > Réponse auto).
+
+Les règles sont compilées en une expression régulière par outil, recompilées
+seulement quand le fichier de settings change. Chaque décision est journalisée.
+"""
+
+import fnmatch
+import os
+import re
+import time
+from dataclasses import dataclass
+
+import metrics
+import settings as telebot_settings
+
+# En-tête du dialogue → outil Claude Code
+DIALOG_TOOLS = {
+    "Bash command": "Bash",
+    "Edit file": "Edit",
+    "Create file": "Write",
+    "Write file": "Write",
+    "Read file": "Read",
+    "Fetch": "WebFetch",
+    "Web Search": "WebSearch",
+}
+
+_RULE_RE = re.compile(r"^(\w+)(?:\((.*)\))?$", re.S)
+_QUESTION_RE = re.compile(
+    r"^Do you want to (?:make this edit to|create|write to|read) (.+?)\?$"
+)
+_OPTION_RE = re.compile(r"^(?:❯\s*)?(\d+)\.\s+(.*)$")
+_SHELL_CHARS = set(";&|<>$`")  # Absents d'une ligne de description
+_FILE_TOOLS = ("Edit", "Write", "Read")
+WORKING_DIR = telebot_settings.DIR  # Répertoire de Claude (bot.WORKING_DIR)
+
+
+@dataclass(frozen=True)
+class Dialog:
+    """Dialogue de permission classé."""
+
+    tool: str
+    subjects: tuple[str, ...]  # Commandes Bash, fichier ou URL concernés
+    yes: str  # Touche de l'option « Yes »
+
+
+@dataclass(frozen=True)
+class Decision:
+    action: str  # allow, deny, ask
+    key: str | None  # Touche à envoyer (None : demander à l'utilisateur)
+    reason: str
+
+
+# --- Classement du dialogue ---
+
+
+def _split_commands(command: str) -> list[str]:
+    """Découpe une commande shell sur ; && || | et les sauts de ligne (hors guillemets)."""
+    parts, current, quote = [], [], ""
+    i = 0
+    while i < len(command):
+        ch = command[i]
+        if quote:
+            if ch == quote:
+                quote = ""
+            elif ch == "\\" and quote == '"' and i + 1 < len(command):
+                current.append(ch)
+                i += 1
+                ch = command[i]
+        elif ch in "'\"":
+            quote = ch
+        elif ch in ";|&\n":
+            parts.append("".join(current))
+            current = []
+            if command[i : i + 2] in ("&&", "||"):
+                i += 1
+            i += 1
+            continue
+        current.append(ch)
+        i += 1
+    parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _is_description(line: str) -> bool:
+    """Ligne de description d'une commande (phrase, sans caractères shell)."""
+    return line[:1].isupper() and not _SHELL_CHARS & set(line)
+
+
+def classify(dialog: str) -> Dialog | None:
+    """Outil et sujets d'un dialogue de permission (None si non reconnu)."""
+    lines = dialog.splitlines()
+    if not lines or lines[0] not in DIALOG_TOOLS:
+        return None
+    tool = DIALOG_TOOLS[lines[0]]
+    question = next((l for l in lines if l.startswith("Do you want to")), "")
+    # Paragraphes entre l'en-tête et la question
+    paragraphs: list[list[str]] = [[]]
+    for line in lines[1 : lines.index(question)] if question else ():
+        if line:
+            paragraphs[-1].append(line)
+        elif paragraphs[-1]:
+            paragraphs.append([])
+    paragraphs = [p for p in paragraphs if p]
+    yes = ""
+    for line in lines:
+        match = _OPTION_RE.match(line)
+        if match and match[2].startswith("Yes"):
+            yes = match[1]
+            break
+    if not question or not yes:
+        return None
+    if tool == "Bash":
+        # Description écartée seulement si une ligne vide la sépare de la
+        # commande ; collée à la commande, elle est vérifiée comme une commande
+        # (ambiguë : sans règle qui la couvre, le dialogue est transmis)
+        if (
+            len(paragraphs) > 1
+            and len(paragraphs[-1]) == 1
+            and _is_description(paragraphs[-1][0])
+        ):
+            paragraphs = paragraphs[:-1]
+        command = "\n".join(line for p in paragraphs for line in p)
+        subjects = tuple(_split_commands(command))
+    elif tool in ("WebFetch", "WebSearch"):
+        subjects = tuple(paragraphs[0][:1]) if paragraphs else ()
+    else:
+        match = _QUESTION_RE.match(question)
+        subjects = (match[1],) if match else ()
+    if not subjects:
+        return None
+    return Dialog(tool, subjects, yes)
+
+
+# --- Règles compilées ---
+
+
+def _bash_regex(pattern: str) -> str:
+    """Bash(npm run test:*) : préfixe ; sinon * joker, commande entière."""
+    if pattern.endswith(":*"):
+        return re.escape(pattern[:-2]) + r"(?:\s.*)?"
+    return ".*".join(re.escape(part) for part in pattern.split("*"))
+
+
+def _spec_regex(tool: str, spec: str) -> str:
+    if tool == "Bash":
+        return _bash_regex(spec)
+    if spec.startswith("domain:"):
+        domain = re.escape(spec[len("domain:") :])
+        return rf"(?:https?://)?(?:[^/]*\.)?{domain}(?:[:/].*)?"
+    return fnmatch.translate(spec)
+
+
+class RuleSet:
+    """Règles allow ou deny, une expression régulière par outil."""
+
+    def __init__(self, rules: frozenset[str]):
+        self.whole: set[str] = set()  # Outils couverts sans restriction
+        patterns: dict[str, list[str]] = {}
+        self.sources: dict[str, list[tuple[re.Pattern, str]]] = {}  # Journal
+        for rule in sorted(rules):
+            match = _RULE_RE.match(rule)
+            if not match:
+                continue
+            tool, spec = match[1], match[2]
+            if spec is None or spec in ("", "*"):
+                self.whole.add(tool)
+                continue
+            regex = _spec_regex(tool, spec)
+            patterns.setdefault(tool, []).append(regex)
+            self.sources.setdefault(tool, []).append((re.compile(regex, re.S), rule))
+        self.compiled = {
+            tool: re.compile("|".join(f"(?:{r})" for r in regexes), re.S)
+            for tool, regexes in patterns.items()
+        }
+
+    def matches(self, tool: str, subject: str) -> bool:
+        if tool in self.whole:
+            return True
+        regex = self.compiled.get(tool)
+        return regex is not None and regex.fullmatch(subject) is not None
+
+    def rule_for(self, tool: str, subject: str) -> str:
+        """Règle qui couvre le sujet (pour le journal)."""
+        if tool in self.whole:
+            return tool
+        for regex, rule in self.sources.get(tool, ()):
+            if regex.fullmatch(subject):
+                return rule
+        return "?"
+
+
+_cache: tuple[frozenset, frozenset, RuleSet, RuleSet] | None = None
+
+
+def _rules() -> tuple[RuleSet, RuleSet]:
+    """Règles allow et deny compilées, recompilées quand les settings changent."""
+    global _cache
+    allow, deny = telebot_settings.get_permission_rules()
+    if _cache is None or _cache[0] is not allow or _cache[1] is not deny:
+        _cache = (allow, deny, RuleSet(allow), RuleSet(deny))
+    return _cache[2], _cache[3]
+
+
+# --- Décision ---
+
+
+def _in_working_dir(path: str) -> bool:
+    """Fichier situé sous le répertoire de travail (liens symboliques résolus)."""
+    root = os.path.realpath(WORKING_DIR)
+    full = os.path.realpath(os.path.join(root, os.path.expanduser(path)))
+    return full == root or full.startswith(root + os.sep)
+
+
+def decide(dialog: str) -> Decision:
+    """Décision pour un dialogue ; journalisée, avec sa durée."""
+    started = time.perf_counter()
+    decision = _decide(dialog)
+    elapsed = (time.perf_counter() - started) * 1000
+    metrics.AUTO_RESPONSES.inc(action=decision.action)
+    first = dialog.splitlines()[0] if dialog else ""
+    print(
+        f"[autorespond] {first!r} → {decision.action} ({decision.reason}, "
+        f"{elapsed:.2f}ms)",
+        flush=True,
+    )
+    return decision
+
+
+def _decide(dialog: str) -> Decision:
+    if not telebot_settings.get_auto_respond():
+        return Decision("ask", None, "réponse auto désactivée")
+    parsed = classify(dialog)
+    if parsed is None:
+        return Decision("ask", None, "dialogue non reconnu")
+    allow, deny = _rules()
+    for subject in parsed.subjects:
+        if deny.matches(parsed.tool, subject):
+            rule = deny.rule_for(parsed.tool, subject)
+            return Decision("deny", "Escape", f"{subject!r} refusé par {rule}")
+    if parsed.tool == "Bash" and any("$(" in s or "`" in s for s in parsed.subjects):
+        return Decision("ask", None, "substitution de commande")
+    if parsed.tool == "Bash" and any("<" in s or ">" in s for s in parsed.subjects):
+        return Decision("ask", None, "redirection")
+    if parsed.tool in _FILE_TOOLS and not all(map(_in_working_dir, parsed.subjects)):
+        return Decision("ask", None, f"{parsed.subjects[0]!r} hors de {WORKING_DIR}")
+    uncovered = [s for s in parsed.subjects if not allow.matches(parsed.tool, s)]
+    if uncovered:
+        return Decision("ask", None, f"{parsed.tool} {uncovered[0]!r} sans règle")
+    rules = sorted({allow.rule_for(parsed.tool, s) for s in parsed.subjects})
+    return Decision("allow", parsed.yes, f"{parsed.tool} : {', '.join(rules)}")
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks du parseur de captures (bot.py) sur des écrans synthétiques.
+
+Usage :
+    python bench.py                       # Tous les scénarios, 2000 lignes
+    python bench.py --lines 5000 -n 50    # Captures plus longues, 50 répétitions
+    python bench.py --save base.json      # Enregistrer une référence
+    python bench.py --compare base.json   # Comparer à la référence (ratio de temps)
+    python bench.py --check               # Vérifications seulement (diff, dialogues)
+
+Pour chaque fonction et chaque scénario : temps médian et minimal par appel,
+et pic de mémoire allouée pendant un appel (tracemalloc). Les vérifications
+de non-régression (DIFF_CHECKS, CLASSIFY_CHECKS) passent avant chaque mesure.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+
+import autorespond
+import bot
+
+STATUS_BAR = "  ~/projet │ Opus 4.6 │ $0.42 │ 23% context"
+SEPARATOR = "─" * 120
+WORDS = (
+    "le bot capture le terminal analyse la zone de réponse puis envoie "
+    "uniquement le texte nouveau à Telegram sans les sorties des outils"
+).split()
+
+
+# --- Génération de captures ---
+
+
+def _sentence(rng: random.Random, width: int = 110) -> str:
+    target = rng.randint(20, width)  # Longueur visée, tirée une fois par phrase
+    words: list[str] = []
+    length = 0
+    while length < target:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def _tool_block(rng: random.Random) -> list[str]:
+    tool = rng.choice(["Read", "Write", "Edit", "Bash", "Grep", "Glob"])
+    lines = [f"⏺ {tool}(src/module_{rng.randint(1, 99)}.py)"]
+    lines.append(f"  ⎿  {_sentence(rng, 80)}")
+    for _ in range(rng.randint(0, 12)):
+        lines.append(f"     {rng.randint(1, 500):>4} {_sentence(rng, 90)}")
+    return lines + [""]
+
+
+def _text_block(rng: random.Random, size: int) -> list[str]:
+    lines = [f"⏺ {_sentence(rng)}"]
+    for _ in range(size):
+        prefix = rng.choice(["  ", "  - ", "  1. ", "    "])
+        lines.append(prefix + _sentence(rng))
+    return lines + [""]
+
+
+def _turn(rng: random.Random, blocks: int) -> list[str]:
+    lines = [f"❯ {_sentence(rng, 60)}", ""]
+    for _ in range(blocks):
+        if rng.random() < 0.5:
+            lines += _tool_block(rng)
+        else:
+            lines += _text_block(rng, rng.randint(1, 15))
+    return lines + ["✻ Cooked for 12s", ""]
+
+
+def _footer(dialog: list[str] | None = None, spinner: bool = False) -> list[str]:
+    lines = ["✻ Thinking… (esc to interrupt)", ""] if spinner else []
+    lines.append(SEPARATOR)
+    if dialog:
+        lines += dialog
+    else:
+        lines.append("❯ ")
+    return lines + [SEPARATOR, STATUS_BAR, "  ⏵⏵ accept edits on (shift+tab to cycle)"]
+
+
+PERMISSION = [
+    " Bash command",
+    "",
+    "   npm run build && npm test",
+    "   Build and run the test suite",
+    "",
+    " Do you want to proceed?",
+    " ❯ 1. Yes",
+    "   2. Yes, and don't ask again for npm run commands",
+    "   3. No, and tell Claude what to do differently (esc)",
+]
+
+MENU = [
+    " ☐ Style  ☐ Couleurs  ✔ Submit",
+    "",
+    "Quel style pour la page ?",
+    "",
+    "❯ 1. Minimaliste",
+    "     Peu d'éléments, beaucoup d'espace",
+    "  2. Moderne",
+    "     Dégradés et animations",
+    "  3. Classique",
+    "  4. Type something.",
+]
+
+
+def make_capture(lines: int, scenario: str, seed: int = 0) -> str:
+    """Capture synthétique d'environ `lines` lignes pour un scénario donné.
+
+    - streaming : réponse en cours (spinner), historique de tours précédents
+    - dialog : dialogue de permission sous la zone de réponse
+    - menu : AskUserQuestion (❯ en colonne 0, options numérotées)
+    - done : réponse terminée, barre de statut
+    - long : une seule réponse très longue (presque tout l'écran)
+    """
+    rng = random.Random(seed)
+    if scenario == "long":
+        current = [f"❯ {_sentence(rng, 60)}", ""]
+        current += _text_block(rng, lines - 12)
+    else:
+        current = _turn(rng, 6)[:-2]
+    history: list[str] = []
+    footer = _footer(
+        dialog=(
+            PERMISSION if scenario == "dialog" else MENU if scenario == "menu" else None
+        ),
+        spinner=scenario == "streaming",
+    )
+    while len(history) + len(current) + len(footer) < lines:
+        history += _turn(rng, rng.randint(2, 8))
+    overflow = len(history) + len(current) + len(footer) - lines
+    return "\n".join(history[max(0, overflow) :] + current + footer)
+
+
+SCENARIOS = ("streaming", "dialog", "menu", "done", "long")
+
+
+# --- Vérifications ---
+
+# Frames successives du texte filtré → parties attendues de advance()
+DIFF_CHECKS = {
+    "ligne vide déjà envoyée": [("A\n\nB", "A\n\nB"), ("A\n\nB\nC", "C")],
+    "formule récurrente d'un tour à l'autre": [
+        (
+            "Le fichier a été créé.\nDis-moi si tu veux autre chose.",
+            "Le fichier a été créé.\nDis-moi si tu veux autre chose.",
+        ),
+        (
+            "J'ai corrigé le bug.\nDis-moi si tu veux autre chose.",
+            "J'ai corrigé le bug.\nDis-moi si tu veux autre chose.",
+        ),
+    ],
+    "début défilé hors capture": [
+        ("un\ndeux\ntrois", "un\ndeux\ntrois"),
+        ("deux\ntrois\nquatre", "quatre"),
+    ],
+    "début défilé, fin répétée": [
+        ("a\nb\nx\nx\nx", "a\nb\nx\nx\nx"),
+        ("b\nx\nx\nx\nx", "x"),
+    ],
+    "frame raccourcie puis complétée": [
+        ("un\ndeux\ntrois", "un\ndeux\ntrois"),
+        ("un\ndeux", ""),
+        ("un\ndeux\ntrois\nquatre", "quatre"),
+    ],
+}
+
+
+def check_diff() -> list[str]:
+    """Échecs des DIFF_CHECKS (liste vide si tout passe)."""
+    failures = []
+    for name, frames in DIFF_CHECKS.items():
+        cursor = bot.DiffCursor()
+        for i, (frame, expected) in enumerate(frames):
+            got = cursor.advance(frame)
+            if got != expected:
+                failures.append(f"{name} (frame {i}) : {got!r} ≠ {expected!r}")
+    return failures
+
+
+def _bash_dialog(*block: str) -> str:
+    return "\n".join(
+        ["Bash command", "", *block, "", "Do you want to proceed?", "❯ 1. Yes", "2. No"]
+    )
+
+
+# Dialogue de permission → sujets attendus de autorespond.classify()
+CLASSIFY_CHECKS = {
+    "description séparée": (
+        _bash_dialog("git status", "", "Show the working tree status"),
+        ("git status",),
+    ),
+    "seconde commande collée (pas une description)": (
+        _bash_dialog("git status", "Rscript cleanup.R"),
+        ("git status", "Rscript cleanup.R"),
+    ),
+}
+
+
+def check_classify() -> list[str]:
+    """Échecs des CLASSIFY_CHECKS (liste vide si tout passe)."""
+    failures = []
+    for name, (dialog, expected) in CLASSIFY_CHECKS.items():
+        parsed = autorespond.classify(dialog)
+        got = parsed.subjects if parsed else None
+        if got != expected:
+            failures.append(f"{name} : {got!r} ≠ {expected!r}")
+    return failures
+
+
+# --- Mesure ---
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Temps par appel (médiane, min) en µs et pic d'allocation en Kio."""
+    func()  # Échauffement
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return {
+        "median_us": statistics.median(times) * 1e6,
+        "min_us": min(times) * 1e6,
+        "peak_kib": peak / 1024,
+    }
+
+
+def cases(capture: str) -> dict[str, Callable[[], object]]:
+    """Une mesure par étape d'une frame ; parse_screen produit réponse, texte,
+    dialogue et état de fin en un seul passage."""
+    lines = capture.splitlines()
+    screen = bot.parse_screen(capture)  # Hors mesure pour le diff et split_chunks
+    # Frame précédente : même écran, réponse amputée de ses dernières lignes
+    previous = "\n".join(screen.text.splitlines()[:-5])
+    return {
+        "_find_response_zone": lambda: bot._find_response_zone(lines),
+        "parse_screen": lambda: bot.parse_screen(capture),
+        "DiffCursor.advance": lambda: bot.DiffCursor(previous).advance(screen.text),
+        "split_chunks": lambda: bot.split_chunks(screen.response),
+    }
+
+
+def run(lines: int, repeat: int) -> dict[str, dict[str, dict[str, float]]]:
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for scenario in SCENARIOS:
+        capture = make_capture(lines, scenario)
+        results[scenario] = {
+            name: measure(func, repeat) for name, func in cases(capture).items()
+        }
+    return results
+
+
+def report(results: dict, baseline: dict | None = None):
+    header = (
+        f"{'scénario':<10} {'fonction':<20} {'médiane':>10} {'min':>10} {'pic':>10}"
+    )
+    if baseline:
+        header += f" {'vs réf.':>8}"
+    print(header)
+    print("-" * len(header))
+    for scenario, funcs in results.items():
+        for name, r in funcs.items():
+            row = (
+                f"{scenario:<10} {name:<20} {r['median_us']:>8.1f}µs "
+                f"{r['min_us']:>8.1f}µs {r['peak_kib']:>7.1f}Kio"
+            )
+            ref = (baseline or {}).get(scenario, {}).get(name)
+            if ref and ref["median_us"]:
+                row += f" {r['median_us'] / ref['median_us']:>7.2f}x"
+            print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=2000, help="lignes par capture")
+    parser.add_argument("-n", "--repeat", type=int, default=200, help="répétitions")
+    parser.add_argument("--save", metavar="FICHIER", help="enregistrer les résultats")
+    parser.add_argument("--compare", metavar="FICHIER", help="comparer à une référence")
+    parser.add_argument("--check", action="store_true", help="vérifier sans mesurer")
+    args = parser.parse_args()
+
+    failures = check_diff() + check_classify()
+    for failure in failures:
+        print(f"ÉCHEC : {failure}")
+    if failures or args.check:
+        return 1 if failures else 0
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(f"Captures de {args.lines} lignes, {args.repeat} répétitions\n")
+    results = run(args.lines, args.repeat)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"lines": args.lines, **results}, f, indent=2)
+            f.write("\n")
+        print(f"\nRésultats enregistrés dans {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,15 @@
 import asyncio
+import collections
+import gzip
 import html
+import logging
 import os
-import subprocess
+import signal
+import time
+from dataclasses import dataclass, field
 
 from dotenv import load_dotenv
-from telegram import BotCommand, Update
+from telegram import BotCommand, Message, Update
 from telegram.constants import ChatAction
 from telegram.ext import (
     Application,
@@ -14,17 +19,31 @@ from telegram.ext import (
     filters,
 )
 
+import access
+import autorespond
+import logfile
+import metrics
+import outbox
+import polling
 import settings as telebot_settings
+import terminal_backend
+import terminal_cmd
+import timeline
+import webhook
+
+logger = logging.getLogger("bot")
 
 load_dotenv()
 
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
-ALLOWED_USER_ID = int(os.getenv("ALLOWED_USER_ID", "0"))
-SESSION_NAME = "claude"
 WORKING_DIR = os.path.dirname(os.path.abspath(__file__))
-_last_response = ""  # Dernière réponse extraite, pour éviter les doublons
-_last_text = ""  # Dernier texte filtré envoyé à Telegram
-_auto_read_task: asyncio.Task | None = None  # Tâche auto_read en cours
+_TYPING_INTERVAL = 4  # L'indicateur "typing" Telegram dure ~5s
+_CHUNK_LIMIT = outbox.PRE_LIMIT  # Taille max d'un morceau, mesurée échappée
+_DOCUMENT_THRESHOLD = 8000  # Au-delà, un texte part en fichier joint (un seul envoi)
+_DOCUMENT_GZIP = 1024 * 1024  # Fichier joint compressé (gzip) au-delà de cette taille
+_PREVIEW_LINES = 12  # Aperçu du fichier joint, en légende
+_ANSWER_GRACE = 3  # Secondes laissées à un dialogue répondu pour disparaître
+_LOG_CHECK_INTERVAL = 60  # Vérification de la taille et de l'âge de bot.log
 
 # Mots-clés d'outils Claude Code pour filtrer le tool output
 _TOOL_KEYWORDS = (
@@ -48,30 +67,25 @@ _TOOL_KEYWORDS = (
 )
 
 
-def auth(func):
-    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not update.message or not update.effective_user:
-            return
-        if update.effective_user.id != ALLOWED_USER_ID:
-            await update.message.reply_text("Non autorisé.")
-            return
-        return await func(update, context)
-
-    return wrapper
-
+def auth(func=None, *, role: str = "operator"):
+    """Réserve un handler aux utilisateurs autorisés ayant au moins ce rôle."""
 
-def run(cmd: str) -> str:
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    return result.stdout.strip() or result.stderr.strip()
+    def decorator(func):
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            if not update.message or not update.effective_user:
+                return
+            user_role = access.role_of(update.effective_user.id)
+            if user_role is None:
+                await update.message.reply_text("Non autorisé.")
+                return
+            if not access.has_role(user_role, role):
+                await update.message.reply_text(f"Non autorisé (rôle {user_role}).")
+                return
+            return await func(update, context)
 
+        return wrapper
 
-def session_exists() -> bool:
-    return (
-        subprocess.run(
-            f"tmux has-session -t {SESSION_NAME}", shell=True, capture_output=True
-        ).returncode
-        == 0
-    )
+    return decorator(func) if func else decorator
 
 
 def _is_separator(line: str) -> bool:
@@ -129,33 +143,15 @@ def _find_response_zone(lines: list[str]) -> tuple[int, int]:
     return (start, end)
 
 
-def extract_response(capture: str) -> str:
-    """Extrait la dernière réponse de Claude depuis la capture du terminal."""
-    lines = capture.splitlines()
-    if not lines:
-        return ""
-    start, end = _find_response_zone(lines)
-    if start >= end:
-        return ""
-    response_lines = []
-    in_response = False
-    for line in lines[start:end]:
-        stripped = line.strip()
-        if not stripped:
-            if in_response:
-                response_lines.append("")
-            continue
-        # Marqueur de réponse Claude ⏺
-        if stripped.startswith(("⏺", "●")):
-            in_response = True
-            response_lines.append(stripped[1:].strip())
-            continue
-        # Contenu indenté après un ⏺ (continuation, ⎿ tool output, listes…)
-        if in_response and (line.startswith("  ") or stripped.startswith("⎿")):
-            response_lines.append(line.rstrip())
-            continue
-        # Ignorer le reste (spinners, activité, timing ✻…)
-    return "\n".join(response_lines).strip()
+def _input_prompt(lines: list[str]) -> bool:
+    """Zone de saisie ❯ (sous un séparateur, en bas de l'écran) sans « esc to interrupt »."""
+    tail = lines[-8:]
+    if any("esc to interrupt" in line for line in tail):
+        return False
+    return any(
+        line.startswith("❯") and not _is_menu_option(line) and _is_separator(prev)
+        for prev, line in zip(tail, tail[1:])
+    )
 
 
 def _is_tool_header(line: str) -> bool:
@@ -172,66 +168,104 @@ def _is_tool_header(line: str) -> bool:
     return False
 
 
-def extract_claude_text(capture: str) -> str:
-    """Extrait uniquement le texte de Claude, sans le tool output ni les blocs de code."""
+@dataclass(frozen=True)
+class ParsedScreen:
+    """Résultat de l'analyse d'une capture, produit en un seul passage."""
+
+    zone: tuple[int, int] = (0, 0)  # Zone de réponse (start, end)
+    prompt: str = ""  # Ligne du prompt ❯ qui ouvre la zone (identifie le tour)
+    response: str = ""  # Réponse complète (avec tool output)
+    text: str = ""  # Texte de Claude seul (sans tool output)
+    dialog: str = ""  # Dialogue interactif en attente
+    done: bool = False  # ⏺ présent, pas de spinner
+    pending_tool: bool = False  # Réponse terminée par un outil sans ⎿
+    idle: bool = False  # Zone de saisie affichée, sans spinner ni dialogue
+
+
+def parse_screen(capture: str) -> ParsedScreen:
+    """Analyse une capture du terminal : un seul splitlines, une seule recherche de zone."""
     lines = capture.splitlines()
     if not lines:
-        return ""
+        return ParsedScreen()
     start, end = _find_response_zone(lines)
+    prompt = lines[start - 1].strip() if start else ""
+    dialog = _parse_dialog(lines, end)
     if start >= end:
-        return ""
+        idle = not dialog and _input_prompt(lines)
+        return ParsedScreen(zone=(start, end), prompt=prompt, dialog=dialog, idle=idle)
+
+    response_lines = []
     text_lines = []
-    in_claude_text = False
+    in_response = False
     in_tool = False
+    has_spinner = False
+    last_line = ""  # Dernière ligne non vide de la zone (détection tool en attente)
     for line in lines[start:end]:
         stripped = line.strip()
         if not stripped:
-            if in_claude_text:
+            if in_response:
+                response_lines.append("")
                 if in_tool:
                     in_tool = False
                 else:
                     text_lines.append("")
             continue
+        last_line = line
         # Marqueur de réponse Claude ⏺
         if stripped.startswith(("⏺", "●")):
-            in_claude_text = True
+            in_response = True
             in_tool = False
             text = stripped[1:].strip()
+            response_lines.append(text)
             if text:
                 text_lines.append(text)
             continue
-        if not in_claude_text:
+        # Spinner / activité en cours → Claude n'a pas fini
+        if "…" in stripped:
+            has_spinner = True
+        if not in_response:
             continue
-        # Tool output ⎿ → ignorer
+        # Tool output ⎿ → gardé dans la réponse, ignoré dans le texte
         if stripped.startswith("⎿"):
+            response_lines.append(line.rstrip())
             in_tool = True
             continue
-        # Ligne indentée
+        # Contenu indenté (continuation, listes, header d'outil…)
         if line.startswith("  "):
+            response_lines.append(line.rstrip())
             if in_tool:
                 continue  # Continuation de tool output → ignorer
             if _is_tool_header(line):
                 in_tool = True
                 continue  # Header d'outil → ignorer
-            # Continuation de texte Claude (liste, paragraphe indenté…)
             text_lines.append(stripped)
             continue
-        # Ignorer le reste (spinners, timing ✻…)
-    return "\n".join(text_lines).strip()
+        # Ignorer le reste (spinners, activité, timing ✻…)
+
+    last = last_line.strip()
+    pending_tool = not last.startswith("⎿") and (
+        _is_tool_header(last_line) or last.startswith("mcp__")
+    )
+    return ParsedScreen(
+        zone=(start, end),
+        prompt=prompt,
+        response="\n".join(response_lines).strip(),
+        text="\n".join(text_lines).strip(),
+        dialog=dialog,
+        done=in_response and not has_spinner,
+        pending_tool=pending_tool,
+        idle=not has_spinner and not dialog and _input_prompt(lines),
+    )
 
 
-def extract_dialog(capture: str) -> str:
-    """Extrait un dialogue interactif (permission, AskUserQuestion, trust prompt…).
+def _parse_dialog(lines: list[str], end: int) -> str:
+    """Extrait le dialogue sous le séparateur ──── qui suit la zone de réponse.
 
-    Détecte les dialogues par la présence d'options numérotées sous le séparateur ────
-    de fin de zone de réponse. Fonctionne pour :
+    Détecte les dialogues par la présence d'options numérotées. Fonctionne pour :
     - Permission dialogs (❯ indenté, options numérotées)
     - AskUserQuestion (❯ colonne 0, barre d'onglets ☐/✔)
     - Trust prompt au démarrage (pas de zone de réponse)
     """
-    lines = capture.splitlines()
-    start, end = _find_response_zone(lines)
-
     # Trouver le premier séparateur ──── à/après la fin de la zone de réponse
     sep_idx = -1
     search_from = end if end > 0 else 0
@@ -269,201 +303,655 @@ def extract_dialog(capture: str) -> str:
     return "\n".join(dialog_lines).strip()
 
 
-def is_claude_done(output: str) -> bool:
-    """Vérifie si Claude a fini de répondre (⏺ présent, pas de spinner, pas de dialogue)."""
-    lines = output.splitlines()
-    start, end = _find_response_zone(lines)
-    if start >= end:
-        return False
-    has_response = False
-    for i in range(start, end):
-        stripped = lines[i].strip()
-        if stripped.startswith(("⏺", "●")):
-            has_response = True
-        if "…" in stripped and not stripped.startswith(("⏺", "●")):
+def _normalize(text: str) -> tuple[str, list[str], list[int]]:
+    """Flux normalisé du texte : mots de chaque ligne séparés par une espace.
+
+    Insensible au re-wrapping du terminal (coupures de lignes, indentation).
+    Retourne (flux, lignes d'origine, offset de début de chaque ligne dans le flux).
+    """
+    lines = text.splitlines()
+    parts = []
+    starts = []
+    pos = 0
+    for line in lines:
+        words = " ".join(line.split())
+        if words and parts:
+            pos += 1  # Espace séparatrice
+        starts.append(pos)
+        if words:
+            parts.append(words)
+            pos += len(words)
+    return " ".join(parts), lines, starts
+
+
+class DiffCursor:
+    """Curseur sur le contenu déjà envoyé, exprimé dans le flux normalisé.
+
+    `advance(new)` retourne uniquement la partie de new située après le contenu
+    déjà envoyé : préfixe direct, sinon début défilé hors capture (la fin du
+    flux envoyé commence new), sinon ancre (fin du flux envoyé, puis deux
+    dernières lignes) dont l'occurrence la plus proche de la position attendue
+    est retenue. Une ligne seule ne sert jamais d'ancre : une formule récurrente
+    (« Dis-moi si… ») se retrouverait dans la réponse suivante.
+    """
+
+    ANCHOR = 160  # Caractères de fin du flux envoyé servant d'ancre
+
+    def __init__(self, sent: str = ""):
+        self.reset()
+        if sent:
+            self._remember(*_normalize(sent))
+
+    def reset(self):
+        self.sent = ""
+        self._tail = 0  # Début des deux dernières lignes dans self.sent
+
+    def _remember(self, stream: str, lines: list[str], starts: list[int]):
+        self.sent = stream
+        filled = [start for line, start in zip(lines, starts) if line.strip()]
+        self._tail = filled[-2] if len(filled) >= 2 else len(stream)
+
+    def advance(self, new: str) -> str:
+        stream, lines, starts = _normalize(new)
+        if self.sent.startswith(stream):
+            return ""  # Frame raccourcie ou redessinée : rien de nouveau
+        cut = self._find_cut(stream)
+        self._remember(stream, lines, starts)
+        if cut is None:
+            return new.strip()  # Contenu sans rapport (nouveau tour) → tout envoyer
+        # Première ligne non vide pas entièrement envoyée ; éventuelle fin partielle
+        for i, start in enumerate(starts):
+            words = " ".join(lines[i].split())
+            if not words or start + len(words) <= cut:
+                continue
+            if start >= cut:
+                return "\n".join(lines[i:]).strip()
+            rest = words[cut - start :]
+            return "\n".join([rest, *lines[i + 1 :]]).strip()
+        return ""
+
+    def _find_cut(self, stream: str) -> int | None:
+        """Offset de fin du contenu déjà envoyé dans stream (None si introuvable)."""
+        sent = self.sent
+        if not sent:
+            return None
+        if stream.startswith(sent):
+            return len(sent)
+        # Le début a pu défiler hors capture ou une ligne a changé : chercher une
+        # ancre, de préférence avant la position attendue (len(sent))
+        if self._tail >= len(sent):
+            return None  # Moins de deux lignes envoyées : pas d'ancre fiable
+        # Début défilé : plus long suffixe de sent (deux lignes au moins) par
+        # lequel commence stream — les répétitions en fin de flux restent justes
+        head = stream[: min(self.ANCHOR, len(sent) - self._tail)]
+        pos = sent.find(head, 0, self._tail + len(head))
+        while pos >= 0:
+            if stream.startswith(sent[pos:]):
+                return len(sent) - pos
+            pos = sent.find(head, pos + 1, self._tail + len(head))
+        # Une ligne antérieure a changé : ancre la plus proche de len(sent)
+        wide = max(0, min(self._tail, len(sent) - self.ANCHOR))
+        for anchor in (sent[wide:], sent[self._tail :]):
+            end = self._nearest(stream, anchor, len(sent))
+            if end is not None:
+                return end
+        return None
+
+    @staticmethod
+    def _nearest(stream: str, anchor: str, expected: int) -> int | None:
+        """Fin de l'occurrence d'anchor la plus proche de expected (None si absente)."""
+        before = stream.rfind(anchor, 0, expected)
+        after = stream.find(anchor, max(0, expected - len(anchor) + 1))
+        ends = [pos + len(anchor) for pos in (before, after) if pos >= 0]
+        return min(ends, key=lambda end: abs(end - expected)) if ends else None
+
+
+@dataclass
+class FrameStats:
+    """Compteurs par tour d'auto_read : frames, frames ignorées, temps d'analyse et de diff."""
+
+    frames: int = 0
+    skipped: int = 0  # Frames à empreinte inchangée (ni analyse ni diff)
+    parse_s: float = 0.0
+    diff_s: float = 0.0
+
+    def reset(self):
+        self.__init__()
+
+
+def _timed_parse(stats: FrameStats, output: str) -> ParsedScreen:
+    t = time.perf_counter()
+    screen = parse_screen(output)
+    elapsed = time.perf_counter() - t
+    metrics.PARSE_SECONDS.observe(elapsed)
+    stats.parse_s += elapsed
+    return screen
+
+
+def _timed_diff(stats: FrameStats, cursor: DiffCursor, new: str) -> str:
+    t = time.perf_counter()
+    diff = cursor.advance(new)
+    elapsed = time.perf_counter() - t
+    metrics.DIFF_SECONDS.observe(elapsed)
+    stats.diff_s += elapsed
+    return diff
+
+
+@dataclass
+class PendingMessage:
+    """Message en attente que Claude soit libre."""
+
+    update: Update
+    text: str
+    turn: timeline.Turn
+
+
+@dataclass
+class Session:
+    """État d'une conversation : terminal, curseur de diff et lecteur auto_read."""
+
+    name: str  # Nom du terminal (session tmux)
+    last_response: str = ""  # Dernière réponse extraite, pour éviter les doublons
+    last_text: str = ""  # Dernier texte filtré envoyé à Telegram
+    prompt: str = ""  # Prompt ❯ du tour suivi par le curseur
+    cursor: DiffCursor = field(default_factory=DiffCursor)  # Curseur d'envoi
+    reader: asyncio.Task | None = None  # Lecteur de la session (un seul à la fois)
+    inbox: collections.deque["PendingMessage"] = field(
+        default_factory=collections.deque
+    )  # Messages reçus pendant que Claude travaille
+    terminal: terminal_backend.TerminalBackend | None = None  # Défaut : open_backend
+    stats: FrameStats = field(default_factory=FrameStats)
+
+    def __post_init__(self):
+        if self.terminal is None:
+            self.terminal = terminal_backend.open_backend(self.name)
+
+    @property
+    def backend(self) -> terminal_backend.TerminalBackend:
+        """Le terminal, toujours présent après __post_init__."""
+        assert self.terminal is not None
+        return self.terminal
+
+    async def exists(self) -> bool:
+        return await self.backend.exists()
+
+    async def create(self, command: str):
+        await self.backend.create(WORKING_DIR, command)
+
+    async def capture(self) -> str:
+        t = time.perf_counter()
+        output = await self.backend.capture()
+        metrics.CAPTURE_SECONDS.observe(time.perf_counter() - t)
+        return output
+
+    async def send_keys(self, *keys: str, literal: bool = False):
+        await self.backend.send_keys(*keys, literal=literal)
+
+    async def paste(self, text: str):
+        await self.backend.paste(text)
+
+    async def wait_output(self, timeout: float) -> bool:
+        """Attend une sortie du terminal (notification %output pour tmux) ou le délai,
+        puis le regroupement propre au terminal."""
+        if not await self.backend.wait_output(timeout):
             return False
-    return has_response
+        if self.backend.debounce:
+            await asyncio.sleep(self.backend.debounce)
+        return True
+
+    def fingerprint(self, output: str) -> int:
+        return self.backend.fingerprint(output)
+
+    async def close(self):
+        """Arrête le lecteur, libère le terminal et oublie le curseur de diff."""
+        if self.reader and not self.reader.done():
+            self.reader.cancel()
+        self.inbox.clear()
+        await self.backend.close()
+        self.last_response = ""
+        self.last_text = ""
+        self.prompt = ""
+        self.cursor.reset()
+
+    async def kill(self):
+        """Termine le terminal (et Claude), puis ferme la session."""
+        await self.backend.kill()
+        await self.close()
+
+
+_sessions: dict[str, Session] = {}  # Registre des sessions, par nom tmux
+metrics.Gauge(
+    "telebot_sessions",
+    "Sessions connues du bot (une par utilisateur)",
+    lambda: len(_sessions),
+)
+metrics.Gauge(
+    "telebot_readers",
+    "Tâches auto_read en cours",
+    lambda: sum(1 for s in _sessions.values() if s.reader and not s.reader.done()),
+)
 
 
-def _has_pending_tool(output: str) -> bool:
-    """Détecte si la réponse se termine par un outil qui attend une confirmation."""
-    lines = output.splitlines()
-    start, end = _find_response_zone(lines)
-    if start >= end:
-        return False
-    # Scanner depuis la fin de la zone de réponse
-    for i in range(end - 1, start - 1, -1):
-        stripped = lines[i].strip()
-        if not stripped:
+def session_name(user_id: int) -> str:
+    return f"{terminal_cmd.SESSION_PREFIX}{user_id}"
+
+
+def get_session(update: Update) -> Session:
+    """Session de l'utilisateur (une par utilisateur autorisé), créée à la demande."""
+    assert update.effective_user
+    name = session_name(update.effective_user.id)
+    session = _sessions.get(name)
+    if session is None:
+        session = _sessions[name] = Session(name)
+    return session
+
+
+# Longueur d'un caractère une fois échappé (html.escape) et compté en UTF-16
+_ESCAPED_WIDTH = {"&": 5, "<": 4, ">": 4, '"': 6, "'": 6}
+
+
+def _split_line(line: str, limit: int) -> list[str]:
+    """Coupe une ligne trop longue en morceaux d'au plus limit (longueur échappée),
+    de préférence après un espace."""
+    pieces = []
+    start = size = 0
+    space = -1  # Dernier espace du morceau en cours
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        width = _ESCAPED_WIDTH.get(ch, 2 if ch > "\uffff" else 1)
+        if size + width > limit:
+            cut = space + 1 if space > start + limit // 2 else max(i, start + 1)
+            pieces.append(line[start:cut])
+            start, size, space, i = cut, 0, -1, cut
             continue
-        # Tool output ⎿ → le tool a déjà été exécuté, pas de dialogue
-        if stripped.startswith("⎿"):
-            return False
-        # Tool header connu (_TOOL_KEYWORDS) ou outil MCP (mcp__*)
-        if _is_tool_header(lines[i]) or stripped.startswith("mcp__"):
-            return True
-        # Autre contenu → pas un tool en attente
-        return False
-    return False
+        if ch == " ":
+            space = i
+        size += width
+        i += 1
+    pieces.append(line[start:])
+    return pieces
 
 
-def compute_diff(old: str, new: str) -> str:
-    """Calcule la partie nouvelle de new par rapport à old."""
-    if not old:
-        return new
-    if new == old:
-        return ""
-    if new.startswith(old):
-        return new[len(old) :].strip()
-    # Recherche par lignes : trouver où le contenu déjà envoyé se termine dans new
-    old_lines = old.splitlines()
-    new_lines = new.splitlines()
-    if not old_lines:
-        return new
-    # Trouver la dernière ligne non-vide de old comme ancre
-    last_old = ""
-    trim_at = len(old_lines)
-    for k in range(len(old_lines) - 1, -1, -1):
-        if old_lines[k].strip():
-            last_old = old_lines[k].strip()
-            trim_at = k + 1
-            break
-    if not last_old:
-        return new
-    # Chercher cette ancre dans new (en partant de la fin)
-    for i in range(len(new_lines) - 1, -1, -1):
-        if new_lines[i].strip() == last_old:
-            match_count = 1
-            for j in range(1, min(trim_at, i + 1)):
-                if old_lines[trim_at - 1 - j].strip() == new_lines[i - j].strip():
-                    match_count += 1
-                else:
-                    break
-            if match_count >= min(2, trim_at):
-                after = new_lines[i + 1 :]
-                return "\n".join(after).strip() if after else ""
-    return new
+def split_chunks(text: str, limit: int = _CHUNK_LIMIT) -> list[str]:
+    """Découpe un texte par lignes en morceaux d'au plus limit caractères une fois
+    échappés ; les lignes plus longues que limit sont elles-mêmes coupées."""
+    chunks = []
+    current: list[str] = []
+    current_len = -1  # Sans le saut de ligne du premier morceau
+    for line in text.splitlines():
+        size = outbox.sent_len(line)
+        pieces = [line] if size <= limit else _split_line(line, limit)
+        for piece in pieces:
+            if len(pieces) > 1:
+                size = outbox.sent_len(piece)
+            if current and current_len + 1 + size > limit:
+                chunks.append("\n".join(current))
+                current = []
+                current_len = -1
+            current.append(piece)
+            current_len += 1 + size
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
 
 
 async def send_chunks(update: Update, text: str):
     """Envoie un texte, découpé en plusieurs messages si nécessaire."""
-    assert update.message
+    assert update.message and update.effective_chat
+    box = outbox.for_chat(update.effective_chat.id)
+    futures = [box.send_text(update.message, chunk) for chunk in split_chunks(text)]
+    await asyncio.gather(*futures)
+
+
+def make_document(text: str) -> tuple[bytes, str]:
+    """Contenu et nom du fichier joint : .md si le texte ressemble à du Markdown."""
+    markdown = any(
+        line.lstrip().startswith(("#", "```", "- ", "* ", "|"))
+        for line in text.splitlines()
+    )
+    data = text.encode()
+    filename = f"reponse-{time.strftime('%Y%m%d-%H%M%S')}.{'md' if markdown else 'txt'}"
+    if len(data) > _DOCUMENT_GZIP:
+        data = gzip.compress(data)
+        filename += ".gz"
+    return data, filename
+
+
+def document_caption(text: str) -> str:
+    """Légende du fichier joint : premières lignes et taille (légende ≤ 1024 caractères)."""
     lines = text.splitlines()
-    chunks = []
-    current = []
-    current_len = 0
-    for line in lines:
-        if current_len + len(line) + 1 > 3900 and current:
-            chunks.append("\n".join(current))
-            current = []
-            current_len = 0
-        current.append(line)
-        current_len += len(line) + 1
-    if current:
-        chunks.append("\n".join(current))
-    for chunk in chunks:
-        await update.message.reply_text(
-            f"<pre>{html.escape(chunk)}</pre>", parse_mode="HTML"
+    preview = "\n".join(lines[:_PREVIEW_LINES])[:700]
+    return (
+        f"<pre>{html.escape(preview)}</pre>\n"
+        f"📄 Réponse complète en pièce jointe ({len(lines)} lignes)"
+    )
+
+
+def send_document(box: outbox.Outbox, message: Message, text: str) -> asyncio.Future:
+    """Met en file l'envoi d'un texte en fichier joint, aperçu en légende."""
+    data, filename = make_document(text)
+    caption = document_caption(text)
+
+    async def upload():
+        sent = await message.reply_document(
+            document=data, filename=filename, caption=caption, parse_mode="HTML"
         )
+        metrics.DOCUMENTS.inc()
+        return sent
+
+    return box.call(upload)
+
+
+async def send_notice(update: Update, text: str):
+    """Envoie un court message texte (sans <pre>) via la file d'envoi du chat."""
+    assert update.message and update.effective_chat
+    await outbox.for_chat(update.effective_chat.id).send_text(
+        update.message, text, pre=False, merge=False
+    )
+
+
+class MessageStream:
+    """Sortie d'un tour auto_read : un nouveau message par diff (mode "messages").
+
+    Les diffs sont mis en file sans attendre leur envoi : si le débit Telegram
+    est atteint, la file les fusionne en messages plus gros.
+    """
 
+    def __init__(self, update: Update):
+        assert update.message and update.effective_chat
+        self.update = update
+        self.outbox = outbox.for_chat(update.effective_chat.id)
+        self._last: asyncio.Future | None = None
+        self.first_delivery: float | None = None  # Premier message délivré (monotonic)
+
+    async def append(self, text: str):
+        assert self.update.message
+        if len(text) > _DOCUMENT_THRESHOLD:
+            self._send_document(text)
+            return
+        for chunk in split_chunks(text):
+            self._last = self.outbox.send_text(self.update.message, chunk)
+            self._last.add_done_callback(self._on_sent)
+
+    def _send_document(self, text: str):
+        """Texte trop long pour quelques messages : un seul envoi en fichier joint."""
+        assert self.update.message
+        self._last = send_document(self.outbox, self.update.message, text)
+        self._last.add_done_callback(self._on_sent)
+
+    def _on_sent(self, future: asyncio.Future):
+        if self.first_delivery is None and future.result() is not None:
+            self.first_delivery = time.monotonic()
+
+    async def flush(self):
+        """Attend l'envoi de tout ce qui a été mis en file."""
+        if self._last is not None:
+            await self._last
+
+
+class LiveMessage(MessageStream):
+    """Un message par tour, édité au fil de l'eau (mode "edit").
+
+    Les éditions sont espacées d'au moins EDIT_INTERVAL secondes ; un nouveau
+    message n'est créé que lorsque le message en cours atteint la limite de taille.
+    """
+
+    EDIT_INTERVAL = 1.5
+
+    def __init__(self, update: Update):
+        super().__init__(update)
+        self._message: Message | None = None  # Message Telegram en cours d'édition
+        self._text = ""  # Contenu voulu du message en cours
+        self._shown = ""  # Contenu affiché par Telegram
+        self._last_edit = 0.0
+        self._timer: asyncio.Task | None = None
+
+    async def append(self, text: str):
+        assert self.update.message
+        if len(text) > _DOCUMENT_THRESHOLD:
+            await self.flush()  # Le texte suivant repartira dans un nouveau message
+            self._message = None
+            self._text = ""
+            self._send_document(text)
+            return
+        for chunk in split_chunks(text):
+            size = outbox.sent_len(self._text) + 1 + outbox.sent_len(chunk)
+            if self._message and size > _CHUNK_LIMIT:
+                await self.flush()  # Message plein : dernière édition, puis suivant
+                self._message = None
+                self._text = ""
+            self._text = f"{self._text}\n{chunk}" if self._text else chunk
+            if self._message is None:
+                self._message = await self.outbox.send_text(
+                    self.update.message, self._text, merge=False
+                )
+                if self.first_delivery is None and self._message is not None:
+                    self.first_delivery = time.monotonic()
+                self._shown = self._text
+                self._last_edit = time.monotonic()
+        delay = self.EDIT_INTERVAL - (time.monotonic() - self._last_edit)
+        if delay <= 0:
+            await self._edit()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._edit_later(delay))
+
+    async def flush(self):
+        """Applique immédiatement la dernière version du message en cours."""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        await self._edit()
+        await super().flush()  # Fichier joint éventuel
+
+    async def _edit_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await self._edit()
+
+    async def _edit(self):
+        message = self._message
+        if message is None or self._text == self._shown:
+            return
+        text = self._text
+        self._shown = text
+        self._last_edit = time.monotonic()
+        # Échec ("Message is not modified", réseau…) journalisé par la file d'envoi
+        metrics.EDITS.inc()
+        await self.outbox.call(
+            lambda: message.edit_text(
+                f"<pre>{html.escape(text)}</pre>", parse_mode="HTML"
+            )
+        )
+
+
+def open_stream(update: Update, mode: str | None = None) -> MessageStream:
+    """Sortie du tour selon le mode d'affichage (settings si mode n'est pas donné)."""
+    if (mode or telebot_settings.get_stream_mode()) == "edit":
+        return LiveMessage(update)
+    return MessageStream(update)
+
+
+def start_auto_read(
+    update: Update, session: Session, turn: timeline.Turn | None = None
+):
+    """Lance le lecteur de la session, sauf s'il tourne déjà (il suit alors la sortie)."""
+    if session.reader and not session.reader.done():
+        if turn is not None:
+            turn.finish("joined")  # Sortie suivie par le tour en cours
+        return
+    session.reader = asyncio.create_task(read_session(update, session, turn))
+
+
+async def read_session(
+    update: Update, session: Session, turn: timeline.Turn | None = None
+):
+    """Lecteur unique de la session : un tour auto_read, puis chaque message en
+    attente, envoyé dès que Claude est libre."""
+    recheck = True
+    while True:
+        outcome = await auto_read(update, session, turn=turn)
+        if outcome in ("cancelled", "dialog") or not session.inbox:
+            return  # Dialogue : les messages attendent la réponse de l'utilisateur
+        if not await session.exists():
+            session.inbox.clear()
+            return
+        screen = parse_screen(await session.capture())
+        if screen.dialog:
+            return
+        if outcome == "done" and not screen.idle and recheck:
+            # Fin confirmée mais zone de saisie non reconnue : encore un tour
+            # de lecture, puis envoi quand même (idem après 30s d'écran figé)
+            recheck = False
+            turn = None
+            continue
+        recheck = True
+        pending = session.inbox.popleft()
+        update, turn = pending.update, pending.turn
+        await type_message(session, pending.text, screen)
+        turn.mark("keys_sent")
+
+
+async def type_message(session: Session, msg: str, screen: ParsedScreen):
+    """Tape un message dans le terminal et le valide."""
+    # Dialogue interactif (menu numéroté) : le chiffre seul suffit — un Enter
+    # en trop validerait le lot suivant
+    if screen.dialog and msg.strip().isdigit():
+        await session.send_keys(msg.strip(), literal=True)
+    elif "\n" in msg:
+        # Message multiligne : collé d'un bloc (sinon chaque ligne serait validée)
+        await session.paste(msg)
+        await session.send_keys("Enter")
+    else:
+        await session.send_keys(msg, literal=True)
+        await session.send_keys("Enter")
 
-def start_auto_read(update: Update):
-    """Lance auto_read en tâche de fond, annule la précédente si elle tourne encore."""
-    global _auto_read_task
-    if _auto_read_task and not _auto_read_task.done():
-        _auto_read_task.cancel()
-    _auto_read_task = asyncio.create_task(auto_read(update))
 
+async def auto_read(
+    update: Update,
+    session: Session,
+    mode: str | None = None,
+    turn: timeline.Turn | None = None,
+) -> str:
+    """Surveille le terminal et envoie le texte de Claude au fil de l'eau (sans tool output).
 
-async def auto_read(update: Update):
-    """Surveille le terminal et envoie le texte de Claude au fil de l'eau (sans tool output)."""
+    Retourne l'issue du tour : "done", "dialog", "timeout" ou "cancelled".
+    """
     assert update.message
-    global _last_response, _last_text
+    session.stats.reset()
+    stream = open_stream(update, mode)
+    turn = turn or timeline.Turn(session.name, "auto")
+    outcome = "cancelled"
     try:
-        await _auto_read_loop(update)
+        outcome = await _auto_read_loop(update, session, stream, turn)
     except asyncio.CancelledError:
-        return
+        return outcome
+    finally:
+        await stream.flush()
+        if stream.first_delivery is not None:
+            turn.mark("first_message", stream.first_delivery)
+        stats = session.stats
+        turn.finish(
+            outcome,
+            frames=stats.frames,
+            skipped=stats.skipped,
+            parse_ms=round(stats.parse_s * 1000, 2),
+            diff_ms=round(stats.diff_s * 1000, 2),
+        )
+    return outcome
+
 
+async def _auto_read_loop(
+    update: Update, session: Session, stream: MessageStream, turn: timeline.Turn
+) -> str:
+    """Boucle interne de auto_read (séparée pour gestion propre du CancelledError).
 
-async def _auto_read_loop(update: Update):
-    """Boucle interne de auto_read (séparée pour gestion propre du CancelledError)."""
+    Retourne l'issue du tour : "done", "dialog" ou "timeout".
+    """
     assert update.message
-    global _last_response, _last_text
-    await asyncio.sleep(1)
+    stats = session.stats
+    sched = polling.PollScheduler.from_settings()
+    await asyncio.sleep(sched.fast)
     sent_any = False
-    previous_raw = ""
-    max_idle = 30  # Timeout seulement après 30s d'inactivité
-    idle_count = 0
+    previous_fp: int | None = None
+    screen = ParsedScreen()
+    last_typing = 0.0
+    answered, answered_at = "", 0.0  # Dernier dialogue répondu automatiquement
     while True:
-        try:
-            await update.message.chat.send_action(ChatAction.TYPING)
-        except Exception:
-            pass  # Ignorer les erreurs réseau sur l'indicateur typing
-        output = run(f"tmux capture-pane -t {SESSION_NAME} -p -S -2000")
+        output = await session.capture()
+        fingerprint = session.fingerprint(output)
+        stats.frames += 1
+        metrics.POLLS.inc()
+        # Frame identique à la précédente → rien à analyser, diffuser ni envoyer
+        if fingerprint == previous_fp:
+            stats.skipped += 1
+            sched.quiet()
+            if session.inbox and screen.idle:
+                # Message en attente et zone de saisie libre : pas besoin
+                # d'attendre la fenêtre de confirmation
+                turn.mark("done")
+                return "done"
+            if sched.confirmed:
+                # Fenêtre de confirmation écoulée sans dialogue → Claude a vraiment fini
+                session.last_response = screen.response or session.last_response
+                turn.mark("done")
+                if not sent_any and not session.inbox:
+                    await send_notice(update, "(aucun changement)")
+                return "done"
+            if sched.timed_out:
+                metrics.TIMEOUTS.inc(source="auto_read")
+                if not sent_any and not session.inbox:
+                    await send_notice(update, "(aucun changement)")
+                return "timeout"
+            # Réveil dès que tmux pousse une sortie, sinon à l'échéance du scheduler
+            await session.wait_output(sched.delay())
+            continue
+        previous_fp = fingerprint
+        sched.changed()
+        if sched.changed_at - last_typing >= _TYPING_INTERVAL:
+            last_typing = sched.changed_at
+            try:
+                await update.message.chat.send_action(ChatAction.TYPING)
+            except Exception:
+                pass  # Ignorer les erreurs réseau sur l'indicateur typing
+        screen = _timed_parse(stats, output)
         # Mettre à jour la réponse complète (pour le tracking interne)
-        response = extract_response(output)
-        if response:
-            _last_response = response
+        if screen.response:
+            session.last_response = screen.response
+        # Nouveau prompt → nouvelle zone de réponse : repartir d'un curseur vide
+        if screen.prompt and screen.prompt != session.prompt:
+            session.prompt = screen.prompt
+            session.last_text = ""
+            session.cursor.reset()
         # Envoyer le texte filtré (sans tool output) au fil de l'eau
-        text = extract_claude_text(output)
-        if text and text != _last_text:
-            diff = compute_diff(_last_text, text)
+        text = screen.text
+        if text and text != session.last_text:
+            diff = _timed_diff(stats, session.cursor, text)
             if diff:
-                await send_chunks(update, diff)
+                turn.mark("first_text")
+                await stream.append(diff)
                 sent_any = True
-            _last_text = text
-        # Dialogue interactif (permission, confirmation…) → envoyer et sortir
-        dialog = extract_dialog(output)
-        if dialog:
-            await send_chunks(update, dialog)
-            return
-        # Claude a fini ? Polling adaptatif pour attendre un éventuel dialogue
-        if is_claude_done(output):
-            max_checks = 8 if _has_pending_tool(output) else 5
-            for _check in range(max_checks):
-                await asyncio.sleep(1)
-                output = run(f"tmux capture-pane -t {SESSION_NAME} -p -S -2000")
-                if not is_claude_done(output):
-                    break  # Faux positif, Claude travaille encore
-                dialog = extract_dialog(output)
-                if dialog:
-                    _last_response = extract_response(output) or _last_response
-                    final_text = extract_claude_text(output)
-                    if final_text and final_text != _last_text:
-                        diff = compute_diff(_last_text, final_text)
-                        if diff:
-                            await send_chunks(update, diff)
-                        _last_text = final_text
-                    await send_chunks(update, dialog)
-                    return
-            else:
-                # Polling terminé sans dialogue → Claude est vraiment fini
-                _last_response = extract_response(output) or _last_response
-                final_text = extract_claude_text(output)
-                if final_text and final_text != _last_text:
-                    diff = compute_diff(_last_text, final_text)
-                    if diff:
-                        await send_chunks(update, diff)
-                        sent_any = True
-                    _last_text = final_text
-                if not sent_any:
-                    await update.message.reply_text("(aucun changement)")
-                return
-            continue  # Faux positif (break) → reprendre la boucle principale
-        # Compteur d'inactivité : reset si le terminal change
-        if output == previous_raw:
-            idle_count += 1
-            if idle_count >= max_idle:
-                if not sent_any:
-                    await update.message.reply_text("(aucun changement)")
-                return
-        else:
-            idle_count = 0
-            previous_raw = output
-        await asyncio.sleep(1)
-
-
-@auth
+            session.last_text = text
+        # Dialogue interactif (permission, confirmation…) : réponse automatique
+        # si les règles des settings le couvrent, sinon envoyer et sortir
+        if screen.dialog and not (
+            screen.dialog == answered and time.monotonic() - answered_at < _ANSWER_GRACE
+        ):
+            decision = autorespond.decide(screen.dialog)
+            if decision.key is None:
+                turn.mark("dialog")
+                await stream.flush()
+                await send_chunks(update, screen.dialog)
+                if stream.first_delivery is None:
+                    # Marqué par auto_read avec le reste : le texte flushé passe avant
+                    stream.first_delivery = time.monotonic()
+                return "dialog"
+            await session.send_keys(decision.key)
+            answered, answered_at = screen.dialog, time.monotonic()
+        # Claude a fini ? Attendre la fenêtre de confirmation (dialogue éventuel)
+        sched.mark_done(screen.done, screen.pending_tool)
+        await session.wait_output(sched.delay())
+
+
+@auth(role="readonly")
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assert update.message
     await update.message.reply_text(
@@ -476,35 +964,59 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "  /n — Refuser (No)\n"
         "  /esc — Annuler (Escape)\n"
         "  /pick N — Choisir l'option N\n\n"
+        "Administration :\n"
+        "  /sessions — Sessions actives (admin)\n\n"
         "Envoie un message texte pour parler à Claude."
     )
 
 
+@auth(role="admin")
+async def list_sessions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Liste les sessions ouvertes par le bot et l'état de leur lecteur."""
+    assert update.message
+    names = await terminal_cmd.bot_sessions()
+    # Terminaux hors tmux (PTY) : connus seulement du registre
+    for name, session in _sessions.items():
+        if session.backend.kind != "tmux" and await session.exists():
+            names.append(name)
+    if not names:
+        await update.message.reply_text("Aucune session active.")
+        return
+    lines = []
+    for name in names:
+        session = _sessions.get(name)
+        reading = session is not None and session.reader and not session.reader.done()
+        queued = len(session.inbox) if session is not None else 0
+        lines.append(
+            f"• {name}{' (lecture en cours)' if reading else ''}"
+            f"{f' — {queued} en attente' if queued else ''}"
+        )
+    await update.message.reply_text("\n".join(lines))
+
+
 @auth
 async def open_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assert update.message
-    if session_exists():
+    session = get_session(update)
+    turn = timeline.Turn(session.name, "open")
+    if await session.exists():
         await update.message.reply_text("Session déjà active.")
         return
-    run(f"tmux new-session -d -s {SESSION_NAME} -x 200 -y 50 -c {WORKING_DIR}")
     flags = telebot_settings.get_claude_flags()
-    cmd = f"claude {flags}".strip()
-    run(f"tmux send-keys -t {SESSION_NAME} -l {subprocess.list2cmdline([cmd])}")
-    run(f"tmux send-keys -t {SESSION_NAME} Enter")
+    await session.create(f"claude {flags}".strip())
+    turn.mark("keys_sent")
     await update.message.reply_text("Session Claude Code ouverte.")
-    start_auto_read(update)
+    start_auto_read(update, session, turn)
 
 
 @auth
 async def close_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assert update.message
-    if not session_exists():
+    session = get_session(update)
+    if not await session.exists():
         await update.message.reply_text("Aucune session active.")
         return
-    global _last_response, _last_text
-    run(f"tmux kill-session -t {SESSION_NAME}")
-    _last_response = ""
-    _last_text = ""
+    await session.kill()
     await update.message.reply_text("Session fermée.")
 
 
@@ -512,22 +1024,34 @@ async def close_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def plain_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Les messages sans commande sont envoyés directement à la session Claude."""
     assert update.message
-    if not session_exists():
+    session = get_session(update)
+    turn = timeline.Turn(session.name, "message")
+    if not await session.exists():
         await update.message.reply_text("Aucune session active. /open d'abord.")
         return
     msg = update.message.text or ""
-    # Détecter si un dialogue interactif est actif (menu numéroté)
-    # Dans ce cas, le chiffre seul suffit — un Enter en trop validerait le lot suivant
-    output = run(f"tmux capture-pane -t {SESSION_NAME} -p -S -2000")
-    dialog = extract_dialog(output)
-    if dialog and msg.strip().isdigit():
-        run(
-            f"tmux send-keys -t {SESSION_NAME} -l {subprocess.list2cmdline([msg.strip()])}"
+    screen = parse_screen(await session.capture())
+    reading = session.reader is not None and not session.reader.done()
+    answer = screen.dialog and msg.strip().isdigit()
+    # Claude travaille, ou des messages attendent déjà : file d'attente, dans
+    # l'ordre — sauf réponse chiffrée à un dialogue affiché. Zone de saisie
+    # libre et file vide (lecteur en fin de tour) : envoi direct
+    if not answer and (session.inbox or (reading and not screen.idle)):
+        session.inbox.append(PendingMessage(update, msg, turn))
+        if not reading and not screen.dialog:
+            # Lecteur arrêté sur un dialogue répondu depuis : le plus ancien d'abord
+            pending = session.inbox.popleft()
+            await type_message(session, pending.text, screen)
+            pending.turn.mark("keys_sent")
+            start_auto_read(pending.update, session, pending.turn)
+        await send_notice(
+            update,
+            f"⏳ En attente ({len(session.inbox)}) : envoyé dès que Claude aura fini.",
         )
-    else:
-        run(f"tmux send-keys -t {SESSION_NAME} -l {subprocess.list2cmdline([msg])}")
-        run(f"tmux send-keys -t {SESSION_NAME} Enter")
-    start_auto_read(update)
+        return
+    await type_message(session, msg, screen)
+    turn.mark("keys_sent")
+    start_auto_read(update, session, turn)
 
 
 def make_key_handler(key: str):
@@ -536,11 +1060,14 @@ def make_key_handler(key: str):
     @auth
     async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         assert update.message
-        if not session_exists():
+        session = get_session(update)
+        turn = timeline.Turn(session.name, key)
+        if not await session.exists():
             await update.message.reply_text("Aucune session active. /open d'abord.")
             return
-        run(f"tmux send-keys -t {SESSION_NAME} {key}")
-        start_auto_read(update)
+        await session.send_keys(key)
+        turn.mark("keys_sent")
+        start_auto_read(update, session, turn)
 
     return handler
 
@@ -549,17 +1076,21 @@ def make_key_handler(key: str):
 async def pick(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Sélectionne l'option N dans un menu interactif (N flèches bas + Enter)."""
     assert update.message
-    if not session_exists():
+    session = get_session(update)
+    if not await session.exists():
         await update.message.reply_text("Aucune session active. /open d'abord.")
         return
     if not context.args or not context.args[0].isdigit():
         await update.message.reply_text("Usage: /pick <N>")
         return
     n = int(context.args[0])
-    for _ in range(max(0, n - 1)):
-        run(f"tmux send-keys -t {SESSION_NAME} Down")
-    run(f"tmux send-keys -t {SESSION_NAME} Enter")
-    start_auto_read(update)
+    turn = timeline.Turn(session.name, "pick")
+    await session.send_keys(*["Down"] * max(0, n - 1), "Enter")
+    turn.mark("keys_sent")
+    start_auto_read(update, session, turn)
+
+
+_log: logfile.RotatingLog | None = None  # Rotation de bot.log (arrière-plan)
 
 
 async def post_init(application):
@@ -570,23 +1101,107 @@ async def post_init(application):
             BotCommand("help", "Aide et commandes"),
         ]
     )
+    await start_metrics()
+    if _log is not None:
+        application.create_task(rotate_logs(_log))
+
+
+async def rotate_logs(log: logfile.RotatingLog):
+    """Vérifie périodiquement la taille et l'âge de bot.log ; compresse hors boucle."""
+    await asyncio.to_thread(log.compress_pending)
+    while True:
+        await asyncio.sleep(_LOG_CHECK_INTERVAL)
+        try:
+            if log.due() and log.rotate():
+                await asyncio.to_thread(log.compress_pending)
+        except OSError as e:
+            logger.error("Rotation impossible : %s", e)
+
+
+async def start_metrics():
+    """Serveur /metrics local si METRICS_PORT est défini dans .env."""
+    port = os.getenv("METRICS_PORT", "").strip()
+    if not port:
+        return
+    if not port.isdigit():
+        logger.warning("METRICS_PORT invalide : %r", port)
+        return
+    try:
+        await metrics.serve(int(port))
+    except OSError as e:
+        logger.error("Serveur /metrics non démarré : %s", e)
+        return
+    print(f"Métriques sur http://127.0.0.1:{port}/metrics")
 
 
 def main():
+    global _log
+    log_file = os.getenv("TELEBOT_LOG_FILE")  # Défini par `telebot start`
+    if log_file:
+        _log = logfile.RotatingLog.from_env(log_file)
+        _log.install()
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        level=logging.WARNING,
+    )
     asyncio.set_event_loop(asyncio.new_event_loop())
-    app = Application.builder().token(TOKEN).post_init(post_init).build()
+    builder = Application.builder().token(TOKEN).post_init(post_init)
+    api_url = os.getenv("TELEGRAM_API_URL", "").strip().rstrip("/")
+    if api_url:  # Fausse Bot API locale (tests)
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(
+            f"{api_url}/file/bot"
+        )
+    app = builder.build()
     app.add_handler(CommandHandler("start", help_cmd))
     app.add_handler(CommandHandler("help", help_cmd))
     app.add_handler(CommandHandler("open", open_session))
     app.add_handler(CommandHandler("close", close_session))
+    app.add_handler(CommandHandler("sessions", list_sessions))
     app.add_handler(CommandHandler("y", make_key_handler("y")))
     app.add_handler(CommandHandler("n", make_key_handler("n")))
     app.add_handler(CommandHandler("esc", make_key_handler("Escape")))
     app.add_handler(CommandHandler("pick", pick))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, plain_message))
-    print("Bot démarré...")
+    access.reload(force=True)
+    mode = os.getenv("TELEBOT_MODE") or ("webhook" if os.getenv("WEBHOOK_URL") else "")
+    if mode == "webhook":
+        config = webhook.WebhookConfig.from_env()
+        if config is None:
+            raise SystemExit(1)
+        asyncio.get_event_loop().run_until_complete(run_webhook(app, config))
+        return
+    print("Bot démarré (polling)...")
     app.run_polling()
 
 
+async def run_webhook(app: Application, config: webhook.WebhookConfig):
+    """Mode webhook : écoute locale et setWebhook, jusqu'à SIGTERM ou Ctrl+C."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async def on_update(data: dict):
+        await app.update_queue.put(Update.de_json(data, app.bot))
+
+    await app.initialize()
+    try:
+        await post_init(app)
+        server = await webhook.serve(config, on_update)
+        await app.bot.set_webhook(
+            config.url, secret_token=config.secret, allowed_updates=Update.ALL_TYPES
+        )
+        await app.start()
+        print(
+            f"Bot démarré (webhook {config.url}, "
+            f"écoute {config.listen}:{config.port}{config.path})..."
+        )
+        await stop.wait()
+        server.close()
+        await app.stop()
+    finally:
+        await app.shutdown()
+
+
 if __name__ == "__main__":
     main()
@@ -2,9 +2,11 @@
 """CLI interactif de gestion du bot Telegram Claude Code."""
 
 import argparse
+import asyncio
 import json
 import os
 import re
+import secrets
 import shutil
 import signal
 import subprocess
@@ -13,7 +15,10 @@ import time
 
 from simple_term_menu import TerminalMenu
 
+import logfile
 import settings as telebot_settings
+import terminal_cmd
+import timeline
 
 DIR = os.path.dirname(os.path.abspath(__file__))
 PID_FILE = os.path.join(DIR, ".bot.pid")
@@ -50,13 +55,23 @@ def bot_status_label():
     return f"\033[32m● actif (PID {pid})\033[0m" if pid else "\033[31m○ inactif\033[0m"
 
 
+def tmux_sessions():
+    """Sessions Claude ouvertes par le bot (claude-<user_id>)."""
+    return terminal_cmd.run_sync(terminal_cmd.bot_sessions())
+
+
+def kill_tmux_sessions(names):
+    async def kill_all():
+        await asyncio.gather(*(terminal_cmd.kill_session(n) for n in names))
+
+    terminal_cmd.run_sync(kill_all())
+
+
 def tmux_status_label():
-    ret = subprocess.run("tmux has-session -t claude", shell=True, capture_output=True)
-    return (
-        "\033[32m● active\033[0m"
-        if ret.returncode == 0
-        else "\033[31m○ inactive\033[0m"
-    )
+    count = len(tmux_sessions())
+    if not count:
+        return "\033[31m○ inactive\033[0m"
+    return f"\033[32m● active{f' ({count})' if count > 1 else ''}\033[0m"
 
 
 def parse_version(tag):
@@ -110,7 +125,8 @@ def check_update(timeout=3):
 # --- Actions ---
 
 
-def do_start(foreground=False):
+def do_start(foreground=False, mode=None):
+    """Lance le bot ; mode "webhook" ou "polling" force le mode de réception."""
     if read_pid():
         print("Le bot tourne déjà.")
         return
@@ -123,7 +139,7 @@ def do_start(foreground=False):
 
     env = _read_env()
     token = env.get("TELEGRAM_BOT_TOKEN", "")
-    user_id = env.get("ALLOWED_USER_ID", "")
+    user_id = env.get("ALLOWED_USER_ID", "") or env.get("ALLOWED_USERS", "")
     if not token or not user_id:
         missing = []
         if not token:
@@ -135,8 +151,15 @@ def do_start(foreground=False):
         print("  - Menu > Paramètres > Configurer (token / user ID)")
         return
 
+    mode = mode or ("webhook" if env.get("WEBHOOK_URL") else "polling")
+    if mode == "webhook" and not (env.get("WEBHOOK_URL") and env.get("WEBHOOK_SECRET")):
+        print("Webhook non configuré (URL publique).")
+        print("  - telebot config")
+        return
+
     if foreground:
-        print("Démarrage en avant-plan (Ctrl+C pour arrêter)...")
+        print(f"Démarrage en avant-plan, mode {mode} (Ctrl+C pour arrêter)...")
+        os.environ["TELEBOT_MODE"] = mode
         os.execv(get_python(), [get_python(), BOT_SCRIPT])
     else:
         log = open(LOG_FILE, "a")
@@ -146,10 +169,12 @@ def do_start(foreground=False):
             stderr=log,
             start_new_session=True,
             cwd=DIR,
+            # Rotation des logs par le bot, mode de réception choisi ici
+            env=dict(os.environ, TELEBOT_LOG_FILE=LOG_FILE, TELEBOT_MODE=mode),
         )
         with open(PID_FILE, "w") as f:
             f.write(str(proc.pid))
-        print(f"Bot démarré (PID {proc.pid}).")
+        print(f"Bot démarré en mode {mode} (PID {proc.pid}).")
 
 
 def do_stop():
@@ -170,13 +195,47 @@ def do_restart():
 def do_status():
     print(f"Bot      : {bot_status_label()}")
     print(f"Session  : {tmux_status_label()}")
+    for name in tmux_sessions():
+        print(f"  • {name}")
 
 
-def do_logs(lines=30):
+def do_logs(lines=30, follow=False, level=None):
+    """Dernières lignes de bot.log (lu depuis la fin), puis la suite avec follow."""
     if not os.path.exists(LOG_FILE):
         print("Aucun log.")
         return
-    subprocess.run(["tail", f"-{lines}", LOG_FILE])
+    min_level = logfile.LEVELS[level.upper()] if level else 0
+    for line in logfile.tail(LOG_FILE, lines, min_level):
+        print(line)
+    if not follow:
+        return
+    try:
+        for line in logfile.follow(LOG_FILE, min_level):
+            print(line, flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def do_stats(last=None):
+    """Percentiles de chaque phase des tours, depuis timeline.jsonl."""
+    turns = timeline.load(last=last)
+    if not turns:
+        print("Aucun tour enregistré.")
+        return
+    outcomes = {}
+    for turn in turns:
+        outcomes[turn.get("outcome", "?")] = (
+            outcomes.get(turn.get("outcome", "?"), 0) + 1
+        )
+    summary = ", ".join(f"{k} {v}" for k, v in sorted(outcomes.items()))
+    print(f"{len(turns)} tours ({summary})\n")
+    print(f"  {'Phase':<34} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for label, values in timeline.phase_durations(turns).items():
+        if not values:
+            print(f"  {label:<34} {0:>5} {'-':>8} {'-':>8} {'-':>8}")
+            continue
+        p50, p95, p99 = (timeline.percentile(values, p) for p in (50, 95, 99))
+        print(f"  {label:<34} {len(values):>5} {p50:>7.2f}s {p95:>7.2f}s {p99:>7.2f}s")
 
 
 def _read_env():
@@ -202,11 +261,14 @@ def do_config():
     env = _read_env()
     token = env.get("TELEGRAM_BOT_TOKEN", "")
     user_id = env.get("ALLOWED_USER_ID", "")
+    users = env.get("ALLOWED_USERS", "")
 
     if token or user_id:
         print("  Configuration actuelle\n")
         print(f"  Token   : {_mask_token(token) if token else '(non défini)'}")
         print(f"  User ID : {user_id or '(non défini)'}")
+        print(f"  Autres  : {users or '(aucun)'}")
+        print(f"  Webhook : {env.get('WEBHOOK_URL') or '(non, long polling)'}")
         print()
         menu = TerminalMenu(
             ["Modifier", "← Retour"],
@@ -223,13 +285,47 @@ def do_config():
     new_token = input(
         f"  Token Telegram (BotFather) [{_mask_token(token) if token else ''}] : "
     ).strip()
-    new_user_id = input(f"  User ID Telegram [{user_id}] : ").strip()
+    new_user_id = input(f"  User ID Telegram (admin) [{user_id}] : ").strip()
+    print(f"\n  {D}Autres utilisateurs : id:rôle séparés par des virgules{R}")
+    print(f"  {D}Rôles : admin, operator, readonly — « - » pour vider{R}")
+    new_users = input(f"  Autres utilisateurs [{users}] : ").strip()
+    env["TELEGRAM_BOT_TOKEN"] = new_token or token
+    env["ALLOWED_USER_ID"] = new_user_id or user_id
+    env["ALLOWED_USERS"] = "" if new_users == "-" else new_users or users
+    _config_webhook(env)
     with open(ENV_FILE, "w") as f:
-        f.write(f"TELEGRAM_BOT_TOKEN={new_token or token}\n")
-        f.write(f"ALLOWED_USER_ID={new_user_id or user_id}\n")
+        for key, val in env.items():
+            if val or key not in _OPTIONAL_ENV:
+                f.write(f"{key}={val}\n")
     print("\n  .env sauvegardé.")
 
 
+_OPTIONAL_ENV = ("ALLOWED_USERS", "WEBHOOK_URL", "WEBHOOK_PORT", "WEBHOOK_SECRET")
+
+
+def _config_webhook(env: dict):
+    """Mode webhook : URL publique (vide : long polling) et port d'écoute local."""
+    url = env.get("WEBHOOK_URL", "")
+    port = env.get("WEBHOOK_PORT", "")
+    print(
+        f"\n  {D}Webhook : URL HTTPS publique relayée vers le bot (vide : polling){R}"
+    )
+    print(f"  {D}« - » pour revenir au polling{R}")
+    new_url = input(f"  URL webhook [{url}] : ").strip()
+    url = "" if new_url == "-" else new_url or url
+    if url and not url.startswith("https://"):
+        print(f"  {D}Telegram n'accepte que des URL https:// — webhook désactivé{R}")
+        url = ""
+    env["WEBHOOK_URL"] = url
+    if not url:
+        return
+    new_port = input(f"  Port d'écoute local [{port or 8080}] : ").strip()
+    if new_port.isdigit():
+        env["WEBHOOK_PORT"] = new_port
+    if not env.get("WEBHOOK_SECRET"):
+        env["WEBHOOK_SECRET"] = secrets.token_urlsafe(32)
+
+
 def do_kill_all():
     pid = read_pid()
     if pid:
@@ -238,10 +334,10 @@ def do_kill_all():
         print("Bot arrêté.")
     else:
         print("Bot déjà inactif.")
-    ret = subprocess.run("tmux has-session -t claude", shell=True, capture_output=True)
-    if ret.returncode == 0:
-        subprocess.run("tmux kill-session -t claude", shell=True, capture_output=True)
-        print("Session tmux fermée.")
+    sessions = tmux_sessions()
+    if sessions:
+        kill_tmux_sessions(sessions)
+        print(f"Sessions tmux fermées ({len(sessions)}).")
     else:
         print("Aucune session tmux active.")
 
@@ -445,10 +541,10 @@ def do_uninstall():
         print("  Bot arrêté.")
 
     # Fermer la session tmux
-    ret = subprocess.run("tmux has-session -t claude", shell=True, capture_output=True)
-    if ret.returncode == 0:
-        subprocess.run("tmux kill-session -t claude", shell=True, capture_output=True)
-        print("  Session tmux fermée.")
+    sessions = tmux_sessions()
+    if sessions:
+        kill_tmux_sessions(sessions)
+        print(f"  Sessions tmux fermées ({len(sessions)}).")
 
     # Supprimer la commande telebot du PATH
     if os.path.exists(bin_path):
@@ -525,6 +621,40 @@ def do_permission_mode():
         print(f"\n  Mode changé : {C}{modes[choice]}{R}")
 
 
+def do_stream_mode():
+    current = telebot_settings.get_stream_mode()
+    items = []
+    for mode, desc in telebot_settings.STREAM_MODES.items():
+        check = " ✓" if mode == current else ""
+        items.append(f"{mode:<10} — {desc}{check}")
+    items.append("← Retour")
+    print(f"  Affichage actuel : {C}{current}{R}\n")
+    menu = TerminalMenu(
+        items,
+        title="  Affichage des réponses",
+        menu_cursor="❯ ",
+        menu_cursor_style=("fg_cyan", "bold"),
+        menu_highlight_style=("fg_cyan", "bold"),
+    )
+    choice = menu.show()
+    modes = list(telebot_settings.STREAM_MODES.keys())
+    if choice is not None and isinstance(choice, int) and choice < len(modes):
+        telebot_settings.set_stream_mode(modes[choice])
+        print(f"\n  Affichage changé : {C}{modes[choice]}{R}")
+
+
+def do_auto_respond():
+    """Active ou désactive la réponse automatique aux dialogues de permission."""
+    enabled = not telebot_settings.get_auto_respond()
+    telebot_settings.set_auto_respond(enabled)
+    if enabled:
+        print(f"  Réponse auto {C}activée{R}")
+        print(f"\n  {D}Les dialogues couverts par les permissions allow/deny sont{R}")
+        print(f"  {D}acceptés ou refusés sans passer par Telegram (voir bot.log).{R}")
+    else:
+        print(f"  Réponse auto {C}désactivée{R} : chaque dialogue est transmis.")
+
+
 def do_permissions():
     while True:
         clear()
@@ -563,10 +693,13 @@ def do_permissions():
             continue
         offset = bash_line_idx + 1
         if choice == offset:  # Ajouter Bash
-            pattern = input("\n  Pattern Bash (ex: git *, npm run *) : ").strip()
-            if pattern:
-                telebot_settings.add_permission(f"Bash({pattern})")
-                print(f"  Ajouté : Bash({pattern})")
+            entry = input(
+                "\n  Pattern(s) Bash, séparés par des virgules (ex: git *, npm run *) : "
+            )
+            rules = [f"Bash({p.strip()})" for p in entry.split(",") if p.strip()]
+            if rules:
+                telebot_settings.update_permissions(add=rules)  # Une seule écriture
+                print(f"  Ajouté : {', '.join(rules)}")
             continue
         if choice == offset + 1:  # Supprimer
             removable = telebot_settings.get_user_allowed()
@@ -621,10 +754,14 @@ def do_settings():
     while True:
         clear()
         mode = telebot_settings.get_permission_mode()
+        stream = telebot_settings.get_stream_mode()
+        auto = "oui" if telebot_settings.get_auto_respond() else "non"
         print(f"\n  {C}Paramètres{R}\n")
         items = [
             f"🔐 Mode de permission          ({mode})",
+            f"💬 Affichage des réponses      ({stream})",
             "🛡  Permissions auto-acceptées",
+            f"🤖 Réponse auto aux dialogues  ({auto})",
             "📄 Voir la configuration",
             "🔑 Token / User ID (.env)",
             "♻  Réinitialiser les paramètres",
@@ -637,20 +774,24 @@ def do_settings():
             menu_highlight_style=("fg_cyan", "bold"),
         )
         choice = menu.show()
-        if choice is None or not isinstance(choice, int) or choice == 5:
+        if choice is None or not isinstance(choice, int) or choice == 7:
             return
         clear()
         print(f"\n  {C}Paramètres{R}\n")
         if choice == 0:
             do_permission_mode()
         elif choice == 1:
+            do_stream_mode()
+        elif choice == 2:
             do_permissions()
             continue  # do_permissions gère son propre écran
-        elif choice == 2:
-            do_show_settings()
         elif choice == 3:
-            do_config()
+            do_auto_respond()
         elif choice == 4:
+            do_show_settings()
+        elif choice == 5:
+            do_config()
+        elif choice == 6:
             do_reset_settings()
         input(f"\n{D}  ⏎  Entrée pour continuer...{R}")
 
@@ -728,6 +869,7 @@ def interactive_menu():
             "⏻  Tout couper (bot + session tmux)",
             "ℹ  Statut",
             "📋 Voir les logs",
+            "📊 Statistiques des tours",
             "⚙  Paramètres",
             "📦 Installer les dépendances",
             "🔄 Réinitialiser le contexte",
@@ -739,6 +881,7 @@ def interactive_menu():
             do_kill_all,
             do_status,
             do_logs,
+            do_stats,
             do_settings,
             do_install,
             do_reset_context,
@@ -786,6 +929,21 @@ def main():
 
     p_start = sub.add_parser("start", help="Démarrer le bot")
     p_start.add_argument("-f", "--foreground", action="store_true")
+    p_mode = p_start.add_mutually_exclusive_group()
+    p_mode.add_argument(
+        "--webhook",
+        dest="mode",
+        action="store_const",
+        const="webhook",
+        help="recevoir les messages par webhook (WEBHOOK_URL)",
+    )
+    p_mode.add_argument(
+        "--polling",
+        dest="mode",
+        action="store_const",
+        const="polling",
+        help="recevoir les messages par long polling",
+    )
 
     sub.add_parser("stop", help="Arrêter le bot")
     sub.add_parser("restart", help="Redémarrer le bot")
@@ -793,6 +951,21 @@ def main():
 
     p_logs = sub.add_parser("logs", help="Voir les logs")
     p_logs.add_argument("-n", "--lines", type=int, default=30)
+    p_logs.add_argument(
+        "-f", "--follow", action="store_true", help="afficher la suite en continu"
+    )
+    p_logs.add_argument(
+        "-l",
+        "--level",
+        type=str.lower,
+        choices=[name.lower() for name in logfile.LEVELS],
+        help="niveau minimal (warning : avertissements et erreurs)",
+    )
+
+    p_stats = sub.add_parser("stats", help="Latences des tours (p50/p95/p99)")
+    p_stats.add_argument(
+        "-n", "--last", type=int, help="seulement les N derniers tours"
+    )
 
     sub.add_parser("kill", help="Tout couper (bot + session tmux)")
     sub.add_parser("config", help="Configurer token et user ID")
@@ -809,11 +982,12 @@ def main():
         return
 
     cmds = {
-        "start": lambda: do_start(args.foreground),
+        "start": lambda: do_start(args.foreground, args.mode),
         "stop": do_stop,
         "restart": do_restart,
         "status": do_status,
-        "logs": lambda: do_logs(args.lines),
+        "logs": lambda: do_logs(args.lines, args.follow, args.level),
+        "stats": lambda: do_stats(args.last),
         "kill": do_kill_all,
         "config": do_config,
         "install": do_install,
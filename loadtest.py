@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Test de charge du lecteur auto_read sur des terminaux en mémoire.
+
+Usage :
+    python loadtest.py                        # 20 sessions, 2000 frames chacune
+    python loadtest.py -s 100 -f 500          # 100 sessions, 500 frames
+    python loadtest.py --rate 200             # 200 frames/s par session (0 : au plus vite)
+
+Chaque session reçoit une réponse qui s'allonge d'une ligne par frame
+(MemoryBackend, sans délai de regroupement), lue par `auto_read` avec un faux
+chat Telegram sans limite de débit ; une frame n'est remplacée qu'une fois
+capturée, pour mesurer le débit maximal du lecteur. Affiche les frames lues par seconde, la part ignorée par
+empreinte, les temps d'analyse et de diff, et le retard maximal de la boucle
+asyncio (une boucle bloquée fige tous les chats).
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+import bench
+import bot
+import outbox
+import replay
+import terminal_backend
+import timeline
+
+
+def frames(count: int, history: int, seed: int) -> list[str]:
+    """Écrans successifs d'une réponse en cours, une ligne de plus à chaque frame."""
+    rng = random.Random(seed)
+    past: list[str] = []
+    while len(past) < history:
+        past += bench._turn(rng, 4)
+    head = past[-history:] + [f"❯ {bench._sentence(rng, 60)}", "", "⏺ Début"]
+    footer = bench._footer(spinner=True)
+    body: list[str] = []
+    screens = []
+    for _ in range(count):
+        body.append(f"  {bench._sentence(rng)}")
+        screens.append("\n".join(head + body + [""] + footer))
+    return screens
+
+
+async def _lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Retard maximal d'un réveil programmé toutes les `interval` secondes."""
+    worst = 0.0
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - t - interval)
+    return worst
+
+
+class LoadBackend(terminal_backend.MemoryBackend):
+    """Terminal en mémoire qui signale chaque capture."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.alive = True
+        self.captured = asyncio.Event()
+
+    async def capture(self) -> str:
+        self.captured.set()
+        return await super().capture()
+
+
+async def _feed(terminal: LoadBackend, screens: list[str], rate: float):
+    """Frames l'une après l'autre, chacune dès la capture de la précédente."""
+    for screen in screens:
+        terminal.captured.clear()
+        terminal.show(screen)
+        await terminal.captured.wait()
+        if rate:
+            await asyncio.sleep(1 / rate)
+
+
+async def run(sessions: int, count: int, history: int, rate: float) -> dict[str, float]:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(_lag(stop))
+    readers, feeders, pool = [], [], []
+    for i in range(sessions):
+        terminal = LoadBackend(f"load-{i}")
+        session = bot.Session(terminal.name, terminal=terminal)
+        turn = timeline.Turn(session.name, "load", path=None)
+        update = replay._Update()
+        update.effective_chat.id = i + 1
+        # Telegram hors mesure : file d'envoi propre à la session, sans limite
+        outbox._outboxes[i + 1] = outbox.Outbox(rate=1e9, burst=10**9)
+        pool.append(session)
+        readers.append(
+            asyncio.create_task(bot.auto_read(update, session, "edit", turn))  # type: ignore[arg-type]
+        )
+        feeders.append(_feed(terminal, frames(count, history, seed=i), rate))
+    started = time.perf_counter()
+    await asyncio.gather(*feeders)
+    await asyncio.sleep(0.2)  # Dernières frames lues
+    elapsed = time.perf_counter() - started
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    stop.set()
+    read = sum(s.stats.frames for s in pool)
+    skipped = sum(s.stats.skipped for s in pool)
+    parsed = max(1, read - skipped)
+    return {
+        "frames_fournies": sessions * count,
+        "frames_lues": read,
+        "frames_par_s": read / elapsed,
+        "ignorees_pct": 100 * skipped / max(1, read),
+        "parse_ms": sum(s.stats.parse_s for s in pool) * 1000 / parsed,
+        "diff_ms": sum(s.stats.diff_s for s in pool) * 1000 / parsed,
+        "retard_boucle_ms": await lag * 1000,
+        "duree_s": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-s", "--sessions", type=int, default=20, help="sessions")
+    parser.add_argument("-f", "--frames", type=int, default=2000, help="frames/session")
+    parser.add_argument("--history", type=int, default=200, help="lignes d'historique")
+    parser.add_argument(
+        "--rate", type=float, default=0, help="frames/s par session (0 : au plus vite)"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{args.sessions} sessions × {args.frames} frames, "
+        f"{args.history} lignes d'historique\n"
+    )
+    results = asyncio.run(run(args.sessions, args.frames, args.history, args.rate))
+    for name, value in results.items():
+        print(f"  {name:<18} {value:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""Journal du bot (bot.log) : rotation compressée et lecture depuis la fin.
+
+En arrière-plan (`telebot start`), le bot écrit sur ses descripteurs 1 et 2,
+redirigés vers bot.log. `RotatingLog` les fait pointer vers un nouveau fichier
+quand le journal dépasse sa taille maximale ou son âge maximal ; l'ancien est
+compressé en bot.log.1.gz (les précédents décalés jusqu'à bot.log.<N>.gz).
+Réglages optionnels dans .env :
+    LOG_MAX_MB=5         # Taille maximale du journal courant
+    LOG_MAX_HOURS=24     # Âge maximal du journal courant
+    LOG_BACKUPS=5        # Archives .gz conservées
+
+Côté CLI, `tail` et `follow` lisent le journal depuis la fin, sans le relire
+en entier, avec un filtre optionnel par niveau.
+"""
+
+import gzip
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+from collections.abc import Iterator
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = 5 * 1024 * 1024
+MAX_AGE = 24 * 3600
+BACKUPS = 5
+
+# Niveaux reconnus dans les lignes (logging, tracebacks) ; défaut : INFO
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+_LEVEL_RE = re.compile(r"\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)\b")
+_ERROR_RE = re.compile(
+    r"^(Traceback \(most recent call last\)|\w+(\.\w+)*(Error|Exception):)"
+)
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name, "").strip()
+    try:
+        return float(value) if value else default
+    except ValueError:
+        logger.warning("%s invalide : %r", name, value)
+        return default
+
+
+class RotatingLog:
+    """Rotation de bot.log pour le processus courant (stdout et stderr)."""
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = MAX_BYTES,
+        max_age: float = MAX_AGE,
+        backups: int = BACKUPS,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.opened = time.time()
+
+    @classmethod
+    def from_env(cls, path: str) -> "RotatingLog":
+        return cls(
+            path,
+            max_bytes=int(_env_number("LOG_MAX_MB", MAX_BYTES / 2**20) * 2**20),
+            max_age=_env_number("LOG_MAX_HOURS", MAX_AGE / 3600) * 3600,
+            backups=max(1, int(_env_number("LOG_BACKUPS", BACKUPS))),
+        )
+
+    def install(self):
+        """Redirige stdout et stderr vers le journal (rotation immédiate s'il est périmé)."""
+        sys.stdout.reconfigure(line_buffering=True)  # Lignes visibles par `logs -f`
+        try:
+            st = os.stat(self.path)
+            if st.st_size and time.time() - st.st_mtime > self.max_age:
+                self.rotate()
+                return
+        except FileNotFoundError:
+            pass
+        self._reopen()
+
+    def _reopen(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+        self.opened = time.time()
+
+    def due(self) -> bool:
+        """Taille ou âge maximal atteint."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if size >= self.max_bytes:
+            return True
+        return size > 0 and time.time() - self.opened >= self.max_age
+
+    def rotate(self) -> str | None:
+        """Décale les archives, bascule sur un journal neuf ; retourne le fichier à compresser."""
+        self.compress_pending()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}.gz")
+        pending = None
+        if os.path.exists(self.path):
+            pending = f"{self.path}.1"
+            os.replace(self.path, pending)
+        self._reopen()
+        return pending
+
+    def compress_pending(self):
+        """Compresse le journal basculé (bot.log.1) s'il ne l'est pas encore."""
+        pending = f"{self.path}.1"
+        if not os.path.exists(pending):
+            return
+        with open(pending, "rb") as src, gzip.open(pending + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(pending + ".gz.tmp", pending + ".gz")
+        os.remove(pending)
+
+
+# --- Lecture (CLI) ---
+
+
+def level_of(line: str, previous: int = LEVELS["INFO"]) -> int:
+    """Niveau d'une ligne ; les lignes indentées (traceback…) héritent de la précédente."""
+    if line[:1] in (" ", "\t"):
+        return previous
+    if _ERROR_RE.match(line):
+        return LEVELS["ERROR"]
+    match = _LEVEL_RE.search(line[:80])
+    if not match:
+        return LEVELS["INFO"]
+    name = {"WARN": "WARNING", "FATAL": "CRITICAL"}.get(match[1], match[1])
+    return LEVELS[name]
+
+
+def _filter(lines: list[str], min_level: int, level: int) -> tuple[list[str], int]:
+    """Lignes d'au moins min_level, et niveau de la dernière (pour la suite)."""
+    if min_level <= 0:
+        return lines, level
+    kept = []
+    for line in lines:
+        level = level_of(line, level)
+        if level >= min_level:
+            kept.append(line)
+    return kept, level
+
+
+def tail(path: str, count: int, min_level: int = 0, block: int = 8192) -> list[str]:
+    """Les `count` dernières lignes (filtrées), lues par blocs depuis la fin du fichier."""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        while True:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            lines = data.decode(errors="replace").splitlines()
+            if pos:
+                lines = lines[1:]  # Première ligne peut-être coupée
+            kept, _ = _filter(lines, min_level, LEVELS["INFO"])
+            if len(kept) > count or not pos:
+                return kept[-count:] if count > 0 else []
+            block *= 2
+
+
+def follow(path: str, min_level: int = 0, interval: float = 0.5) -> Iterator[str]:
+    """Lignes ajoutées au journal, en suivant les rotations (Ctrl+C pour arrêter)."""
+    f = open(path, "rb")
+    f.seek(0, os.SEEK_END)
+    partial = b""
+    level = LEVELS["INFO"]
+    try:
+        while True:
+            data = f.read()
+            if data:
+                *complete, partial = (partial + data).split(b"\n")
+                lines = [line.decode(errors="replace") for line in complete]
+                kept, level = _filter(lines, min_level, level)
+                yield from kept
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                st = None  # Entre le renommage et la réouverture
+            if st is not None and st.st_ino != os.fstat(f.fileno()).st_ino:
+                # Rotation : l'ancien fichier a été lu jusqu'au bout
+                if partial:
+                    kept, level = _filter(
+                        [partial.decode(errors="replace")], min_level, level
+                    )
+                    yield from kept
+                f.close()
+                f = open(path, "rb")
+                partial = b""
+                continue
+            if st is not None and st.st_size < f.tell():
+                f.seek(0)  # Tronqué
+            time.sleep(interval)
+    finally:
+        f.close()
@@ -0,0 +1,160 @@
+"""Métriques du bot au format texte Prometheus, servies sur /metrics (optionnel).
+
+Activé par METRICS_PORT dans .env (écoute sur 127.0.0.1 uniquement) :
+    METRICS_PORT=9464
+puis `curl localhost:9464/metrics`. Sans dépendance : compteurs, jauges et
+histogrammes minimalistes, rendus à la demande.
+"""
+
+import asyncio
+import bisect
+from collections.abc import Callable
+
+# Bornes (secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry: list["_Metric"] = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{{{inner}}}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, value in (self._values or {(): 0}).items():
+            lines.append(f"{self.name}{_labels(dict(key))} {value:g}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Jauge calculée au moment du rendu (fonction fournie à la création)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]):
+        super().__init__(name, help)
+        self.func = func
+
+    def render(self) -> list[str]:
+        return super().render() + [f"{self.name} {self.func():g}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Dernière case : +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self._counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum:g}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+CAPTURE_SECONDS = Histogram(
+    "telebot_capture_seconds", "Durée d'une capture du terminal"
+)
+PARSE_SECONDS = Histogram("telebot_parse_seconds", "Durée d'analyse d'une capture")
+DIFF_SECONDS = Histogram("telebot_diff_seconds", "Durée du diff d'une frame")
+SEND_SECONDS = Histogram("telebot_send_seconds", "Durée d'un appel API Telegram")
+POLLS = Counter("telebot_polls_total", "Captures effectuées par auto_read")
+CAPTURE_ROWS = Counter(
+    "telebot_capture_rows_total", "Lignes relues par capture-pane (mode delta ou full)"
+)
+MESSAGES = Counter("telebot_messages_sent_total", "Messages Telegram envoyés")
+MERGED = Counter(
+    "telebot_messages_merged_total", "Messages économisés par fusion dans l'outbox"
+)
+DOCUMENTS = Counter(
+    "telebot_documents_sent_total", "Réponses longues envoyées en fichier joint"
+)
+EDITS = Counter("telebot_edits_total", "Messages Telegram édités")
+RETRY_AFTER = Counter("telebot_retry_after_total", "RetryAfter reçus de Telegram")
+AUTO_RESPONSES = Counter(
+    "telebot_auto_responses_total", "Dialogues de permission, par décision"
+)
+TIMEOUTS = Counter("telebot_timeouts_total", "Délais dépassés, par source")
+
+
+def render() -> str:
+    return "\n".join(line for m in _registry for line in m.render()) + "\n"
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (
+            b"\r\n",
+            b"\n",
+            b"",
+        ):
+            pass  # En-têtes ignorés
+        parts = request.decode(errors="replace").split()
+        if (
+            len(parts) >= 2
+            and parts[0] == "GET"
+            and parts[1].split("?")[0] == "/metrics"
+        ):
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port: int, host: str = "127.0.0.1") -> asyncio.AbstractServer:
+    """Démarre le serveur /metrics sur la boucle courante."""
+    return await asyncio.start_server(_handle, host, port)
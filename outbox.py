@@ -0,0 +1,209 @@
+"""File d'envoi Telegram par chat : limiteur token bucket, RetryAfter, fusion des messages.
+
+Tous les envois d'un chat passent par la même file, dans l'ordre. Quand des
+messages texte s'accumulent (limite de débit atteinte), les messages consécutifs
+sont fusionnés en messages plus gros, jusqu'à la limite de taille.
+Les échecs sont journalisés et ne remontent jamais à l'appelant (résultat None).
+"""
+
+import asyncio
+import collections
+import html
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from telegram import Message
+from telegram.error import NetworkError, RetryAfter, TelegramError, TimedOut
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE = 1.0  # Messages par seconde et par chat privé
+GROUP_RATE = 20 / 60  # Messages par seconde dans un groupe
+BURST = 3  # Envois immédiats autorisés avant limitation
+MESSAGE_LIMIT = 4096  # Taille max d'un message Telegram (unités UTF-16)
+PRE_LIMIT = MESSAGE_LIMIT - len("<pre></pre>")  # Texte échappé dans un <pre>
+MAX_RETRIES = 3  # Tentatives sur erreur réseau
+
+
+class TokenBucket:
+    """Limiteur de débit : rate jetons par seconde, au plus burst en réserve."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._stamp) * self.rate
+            )
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def drain(self):
+        """Vide la réserve (après un RetryAfter)."""
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+
+
+@dataclass
+class _Item:
+    future: asyncio.Future
+    message: Message | None = None  # Message auquel répondre (envoi texte)
+    text: str = ""
+    pre: bool = True  # Formatage <pre> (HTML)
+    merge: bool = True  # Fusion autorisée avec les textes voisins
+    func: Callable[[], Awaitable[Any]] | None = None  # Autre appel API (édition…)
+    merged: list["_Item"] = field(default_factory=list)
+
+
+def sent_len(text: str, pre: bool = True) -> int:
+    """Longueur comptée par Telegram : unités UTF-16, après html.escape si <pre>."""
+    if pre:
+        text = html.escape(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _format(text: str, pre: bool) -> dict:
+    if pre:
+        return {"text": f"<pre>{html.escape(text)}</pre>", "parse_mode": "HTML"}
+    return {"text": text}
+
+
+def _retry_delay(e: RetryAfter) -> float:
+    delay = e.retry_after
+    return delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+
+
+class Outbox:
+    """File d'envoi d'un chat, vidée par une tâche de fond."""
+
+    def __init__(self, rate: float = RATE, burst: int = BURST):
+        self._items: collections.deque[_Item] = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._bucket = TokenBucket(rate, burst)
+        self._worker: asyncio.Task | None = None
+
+    def send_text(
+        self, message: Message, text: str, *, pre: bool = True, merge: bool = True
+    ) -> asyncio.Future:
+        """Met un texte en file ; le futur donne le Message envoyé (ou None)."""
+        item = _Item(
+            asyncio.get_running_loop().create_future(),
+            message=message,
+            text=text,
+            pre=pre,
+            merge=merge,
+        )
+        self._push(item)
+        return item.future
+
+    def call(self, func: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Met en file un autre appel API (ex: edit_text), soumis au même débit."""
+        item = _Item(asyncio.get_running_loop().create_future(), func=func)
+        self._push(item)
+        return item.future
+
+    @property
+    def pending(self) -> int:
+        return len(self._items)
+
+    def _push(self, item: _Item):
+        self._items.append(item)
+        self._wakeup.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def _take(self) -> _Item:
+        """Retire le prochain envoi, fusionné avec les textes compatibles qui suivent."""
+        item = self._items.popleft()
+        if item.func is not None or not item.merge:
+            return item
+        limit = PRE_LIMIT if item.pre else MESSAGE_LIMIT
+        size = sent_len(item.text, item.pre)
+        while self._items:
+            nxt = self._items[0]
+            if nxt.func is not None or not nxt.merge or nxt.pre != item.pre:
+                break
+            nxt_size = sent_len(nxt.text, nxt.pre)
+            if size + 1 + nxt_size > limit:
+                break
+            self._items.popleft()
+            item.merged.append(nxt)
+            size += 1 + nxt_size
+        return item
+
+    async def _run(self):
+        while True:
+            if not self._items:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._bucket.acquire()
+            item = self._take()
+            result = await self._deliver(item)
+            for it in (item, *item.merged):
+                if not it.future.done():
+                    it.future.set_result(result)
+
+    async def _deliver(self, item: _Item) -> Any:
+        if item.merged:
+            item.text = "\n".join([item.text, *(it.text for it in item.merged)])
+            metrics.MERGED.inc(len(item.merged))
+        failures = 0
+        while True:
+            try:
+                started = time.perf_counter()
+                if item.func is not None:
+                    result = await item.func()
+                else:
+                    assert item.message
+                    result = await item.message.reply_text(
+                        **_format(item.text, item.pre)
+                    )
+                    metrics.MESSAGES.inc()
+                metrics.SEND_SECONDS.observe(time.perf_counter() - started)
+                return result
+            except RetryAfter as e:
+                # Flood control : attendre le délai imposé puis réessayer le même envoi
+                metrics.RETRY_AFTER.inc()
+                delay = _retry_delay(e)
+                logger.warning("RetryAfter %.0fs", delay)
+                await asyncio.sleep(delay)
+                self._bucket.drain()
+            except NetworkError as e:
+                if isinstance(e, TimedOut):
+                    metrics.TIMEOUTS.inc(source="telegram")
+                failures += 1
+                if failures > MAX_RETRIES:
+                    logger.error("Abandon après erreur réseau : %s", e)
+                    return None
+                await asyncio.sleep(2 ** (failures - 1))
+            except TelegramError as e:
+                logger.error("Envoi refusé : %s", e)
+                return None
+            except Exception as e:
+                logger.exception("Erreur inattendue : %r", e)
+                return None
+
+
+_outboxes: dict[int, Outbox] = {}
+
+
+def for_chat(chat_id: int) -> Outbox:
+    """File d'envoi du chat, créée à la demande."""
+    box = _outboxes.get(chat_id)
+    if box is None:
+        box = _outboxes[chat_id] = Outbox(GROUP_RATE if chat_id < 0 else RATE)
+    return box
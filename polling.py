@@ -0,0 +1,71 @@
+"""Cadence de capture d'auto_read : rapide quand le terminal bouge, ralentie sinon.
+
+Tant que la sortie change, le terminal est relu toutes les `fast` secondes ;
+chaque frame identique double l'intervalle, jusqu'à `slow`. La fin d'un tour
+n'est confirmée qu'après une fenêtre de calme (plus longue si un outil attend),
+pour laisser à un éventuel dialogue de permission le temps d'apparaître.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+import settings as telebot_settings
+
+
+@dataclass
+class PollScheduler:
+    fast: float = 0.15  # Intervalle quand la sortie change (secondes)
+    slow: float = 2.0  # Intervalle max quand le terminal est calme
+    factor: float = 2.0  # Facteur de ralentissement par frame identique
+    idle_timeout: float = 30  # Abandon après ce délai sans aucun changement
+    confirm: float = 5  # Fenêtre de confirmation de fin de tour
+    confirm_tool: float = 8  # Idem quand un outil attend (dialogue probable)
+    interval: float = field(init=False)
+    changed_at: float = field(init=False)
+    done_since: float | None = field(init=False, default=None)
+    _window: float = field(init=False, default=0)
+
+    def __post_init__(self):
+        self.interval = self.fast
+        self.changed_at = time.monotonic()
+
+    @classmethod
+    def from_settings(cls) -> "PollScheduler":
+        return cls(**telebot_settings.get_polling())
+
+    def changed(self):
+        """La frame a changé : revenir à la cadence rapide."""
+        self.interval = self.fast
+        self.changed_at = time.monotonic()
+
+    def quiet(self):
+        """Frame identique : ralentir."""
+        self.interval = min(self.slow, self.interval * self.factor)
+
+    def mark_done(self, done: bool, pending_tool: bool = False):
+        """Claude semble avoir fini (ou non) : ouvre ou annule la fenêtre de confirmation."""
+        if not done:
+            self.done_since = None
+        elif self.done_since is None:
+            self.done_since = time.monotonic()
+            self._window = self.confirm_tool if pending_tool else self.confirm
+
+    @property
+    def confirmed(self) -> bool:
+        """Fin de tour confirmée : rien n'a changé pendant toute la fenêtre."""
+        if self.done_since is None:
+            return False
+        return time.monotonic() - max(self.done_since, self.changed_at) >= self._window
+
+    @property
+    def timed_out(self) -> bool:
+        return time.monotonic() - self.changed_at >= self.idle_timeout
+
+    def delay(self) -> float:
+        """Attente avant la prochaine capture, bornée par l'échéance en cours."""
+        now = time.monotonic()
+        if self.done_since is not None:
+            deadline = max(self.done_since, self.changed_at) + self._window
+        else:
+            deadline = self.changed_at + self.idle_timeout
+        return max(0.0, min(self.interval, deadline - now))
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Enregistrement et rejeu de sessions terminal, pour mesurer la latence hors ligne.
+
+Usage :
+    python replay.py record claude-123456 tour.rec   # Ctrl+C pour arrêter
+    python replay.py play tour.rec --speed 4 --mode edit
+
+L'enregistreur s'attache à une session tmux (tmux -C) et ajoute au fichier
+chaque frame qui change, horodatée. Le rejeu fournit ces frames à `auto_read`
+(temps réel ou accéléré) avec un faux chat Telegram qui note chaque envoi, puis
+affiche par tour : délai avant le premier message, messages, éditions et
+lignes envoyées en double.
+
+Format (JSON lines, en ajout seul) : une ligne d'en-tête, puis une ligne par
+frame `[t, drop, keep, add, tail]` — la frame est
+`précédente[drop:drop+keep] + add + précédente[-tail:]` : seules les lignes
+nouvelles sont stockées, même quand le terminal défile ou que seul le milieu
+de l'écran change (la barre de statut est reprise de la frame précédente).
+"""
+
+import argparse
+import asyncio
+import html
+import json
+import sys
+import time
+from dataclasses import dataclass
+
+import bot
+import terminal_backend
+import timeline
+import tmux_control
+
+FORMAT_VERSION = 1
+_MATCH = 3  # Lignes comparées pour retrouver le début d'une frame dans la précédente
+
+
+# --- Format de fichier ---
+
+
+def _delta(prev: list[str], new: list[str]) -> tuple[int, int, list[str], int]:
+    """(drop, keep, add, tail) tels que new == prev[drop:drop+keep] + add + prev[-tail:]."""
+    best = (0, 0)
+    candidates = [0]
+    if len(new) >= _MATCH:
+        head = new[:_MATCH]
+        candidates += [
+            i
+            for i in range(1, len(prev))
+            if prev[i] == head[0] and prev[i : i + _MATCH] == head
+        ]
+    for drop in candidates:
+        keep = 0
+        limit = min(len(prev) - drop, len(new))
+        while keep < limit and prev[drop + keep] == new[keep]:
+            keep += 1
+        if keep > best[1]:
+            best = (drop, keep)
+    drop, keep = best
+    tail = 0
+    limit = min(len(new) - keep, len(prev) - drop - keep)
+    while tail < limit and prev[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    return drop, keep, new[keep : len(new) - tail], tail
+
+
+class FrameWriter:
+    """Fichier d'enregistrement ouvert en ajout, une ligne écrite (et vidée) par frame."""
+
+    def __init__(self, path: str, session: str):
+        self._file = open(path, "x", encoding="utf-8")  # Ne jamais écraser
+        self._start = time.monotonic()
+        self._prev: list[str] = []
+        self.frames = 0
+        header = {"v": FORMAT_VERSION, "session": session, "start": time.time()}
+        self._file.write(json.dumps(header) + "\n")
+        self._file.flush()
+
+    def write(self, text: str):
+        lines = text.splitlines()
+        delta = _delta(self._prev, lines)
+        t = round(time.monotonic() - self._start, 3)
+        self._file.write(json.dumps([t, *delta], ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._prev = lines
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+
+def load_frames(path: str) -> list[tuple[float, str]]:
+    """Relit un enregistrement : liste de (instant en secondes, capture)."""
+    frames = []
+    prev: list[str] = []
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("v") != FORMAT_VERSION:
+            raise ValueError(f"{path} : version {header.get('v')} non supportée")
+        for line in f:
+            if not line.strip():
+                continue
+            t, drop, keep, add, tail = json.loads(line)
+            prev = prev[drop : drop + keep] + add + prev[len(prev) - tail :]
+            frames.append((t, "\n".join(prev)))
+    return frames
+
+
+async def record(session: str, path: str, duration: float | None = None):
+    """Enregistre les frames du pane jusqu'à la fin de la session (ou du délai)."""
+    control = tmux_control.TmuxControl(session)
+    await control.connect()
+    writer = FrameWriter(path, session)
+    start = time.monotonic()
+    last_fp = None
+    try:
+        while control.alive:
+            if duration is not None and time.monotonic() - start >= duration:
+                break
+            text = await control.buffer.capture()
+            if control.buffer.fingerprint != last_fp:
+                last_fp = control.buffer.fingerprint
+                writer.write(text)
+            if await control.wait_output(1):
+                await asyncio.sleep(terminal_backend.TmuxBackend.debounce)
+    finally:
+        writer.close()
+        await control.close()
+        print(f"{writer.frames} frames enregistrées dans {path}")
+
+
+# --- Rejeu ---
+
+
+class ReplayBackend(terminal_backend.MemoryBackend):
+    """Terminal dont l'écran suit un enregistrement, rejoué à `speed` fois la vitesse."""
+
+    kind = "replay"
+    debounce = terminal_backend.TmuxBackend.debounce  # Cadence du bot en production
+
+    def __init__(self, name: str, frames: list[tuple[float, str]], speed: float = 1.0):
+        super().__init__(name)
+        self.frames = frames
+        self.speed = speed
+        self.alive = True
+        self._start = time.monotonic()
+        self._index = 0  # Nombre de frames déjà visibles
+
+    @property
+    def clock(self) -> float:
+        """Instant courant de l'enregistrement."""
+        return (time.monotonic() - self._start) * self.speed
+
+    @property
+    def finished(self) -> bool:
+        return self._index >= len(self.frames)
+
+    def _next_in(self) -> float | None:
+        """Secondes réelles avant la prochaine frame (None si terminé)."""
+        if self.finished:
+            return None
+        return max(0.0, (self.frames[self._index][0] - self.clock) / self.speed)
+
+    async def capture(self) -> str:
+        clock = self.clock
+        while not self.finished and self.frames[self._index][0] <= clock:
+            self._index += 1
+        if self._index:
+            self.screen = self.frames[self._index - 1][1]
+        return await super().capture()
+
+    async def wait_output(self, timeout: float) -> bool:
+        delay = self._next_in()
+        if delay is None or delay > timeout:
+            await asyncio.sleep(timeout)
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+    async def wait_next_frame(self) -> bool:
+        """Attend la prochaine frame (début du tour suivant) ; False si terminé."""
+        delay = self._next_in()
+        if delay is None:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+
+class _Sent:
+    """Message envoyé au faux chat : garde son dernier contenu."""
+
+    def __init__(self, chat: "_Chat", text: str):
+        self.chat = chat
+        self.text = text
+
+    async def edit_text(self, text: str, **kwargs):
+        self.chat.log.append((time.monotonic(), "edit"))
+        self.text = text
+        return self
+
+
+class _Chat:
+    id = 0  # Chat privé fictif (débit de la file d'envoi : 1 msg/s)
+
+    def __init__(self):
+        self.log: list[tuple[float, str]] = []  # (instant, "send" | "edit")
+        self.messages: list[_Sent] = []
+
+    async def send_action(self, action):
+        pass
+
+
+class _Message:
+    def __init__(self, chat: _Chat):
+        self.chat = chat
+
+    async def reply_text(self, text: str, **kwargs):
+        self.chat.log.append((time.monotonic(), "send"))
+        sent = _Sent(self.chat, text)
+        self.chat.messages.append(sent)
+        return sent
+
+    async def reply_document(self, document: bytes, caption: str = "", **kwargs):
+        return await self.reply_text(caption)
+
+
+class _Update:
+    """Faux Update Telegram : enregistre les envois au lieu de les transmettre."""
+
+    def __init__(self):
+        self.effective_chat = _Chat()
+        self.message = _Message(self.effective_chat)
+        self.effective_user = None
+
+
+@dataclass
+class TurnMetrics:
+    first_message_s: float | None  # Délai avant le premier envoi
+    messages: int  # Messages envoyés
+    edits: int  # Éditions de messages
+    duplicates: int  # Lignes envoyées plus d'une fois
+    frames: int  # Captures analysées ou ignorées
+    duration_s: float
+
+
+def _delivered_lines(messages: list[_Sent]) -> list[str]:
+    lines = []
+    for sent in messages:
+        text = sent.text.removeprefix("<pre>").removesuffix("</pre>")
+        lines += [line.strip() for line in html.unescape(text).splitlines()]
+    return [line for line in lines if line]
+
+
+async def replay(
+    path: str, speed: float = 1.0, mode: str | None = None
+) -> list[TurnMetrics]:
+    """Rejoue un enregistrement dans auto_read, un tour par reprise de la sortie."""
+    terminal = ReplayBackend("replay", load_frames(path), speed)
+    session = bot.Session("replay", terminal=terminal)
+    turns = []
+    while await terminal.wait_next_frame():
+        update = _Update()
+        chat = update.effective_chat
+        started = time.monotonic()
+        turn = timeline.Turn(session.name, "replay", path=None)
+        await bot.auto_read(update, session, mode, turn)  # type: ignore[arg-type]
+        sends = [t for t, kind in chat.log if kind == "send"]
+        lines = _delivered_lines(chat.messages)
+        turns.append(
+            TurnMetrics(
+                first_message_s=sends[0] - started if sends else None,
+                messages=len(sends),
+                edits=sum(1 for _, kind in chat.log if kind == "edit"),
+                duplicates=len(lines) - len(set(lines)),
+                frames=session.stats.frames,
+                duration_s=time.monotonic() - started,
+            )
+        )
+    return turns
+
+
+def report(turns: list[TurnMetrics]):
+    print(
+        f"{'tour':>4} {'1er msg':>9} {'messages':>9} {'éditions':>9} "
+        f"{'doublons':>9} {'frames':>7} {'durée':>8}"
+    )
+    for i, m in enumerate(turns, 1):
+        first = f"{m.first_message_s:.2f}s" if m.first_message_s is not None else "-"
+        print(
+            f"{i:>4} {first:>9} {m.messages:>9} {m.edits:>9} "
+            f"{m.duplicates:>9} {m.frames:>7} {m.duration_s:>7.1f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="enregistrer une session tmux")
+    rec.add_argument("session", help="nom de la session tmux (ex: claude-123456)")
+    rec.add_argument("file", help="fichier d'enregistrement (nouveau)")
+    rec.add_argument("--duration", type=float, help="durée max en secondes")
+    play = sub.add_parser("play", help="rejouer un enregistrement dans auto_read")
+    play.add_argument("file")
+    play.add_argument("--speed", type=float, default=1.0, help="facteur de vitesse")
+    play.add_argument("--mode", choices=sorted(bot.telebot_settings.STREAM_MODES))
+    args = parser.parse_args()
+
+    if args.command == "record":
+        try:
+            asyncio.run(record(args.session, args.file, args.duration))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    report(asyncio.run(replay(args.file, args.speed, args.mode)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
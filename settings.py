@@ -1,10 +1,16 @@
 """Gestion des settings Claude Code (permissions, mode)."""
 
+import contextlib
+import copy
+import fcntl
 import json
 import os
+import tempfile
+from collections.abc import Iterable, Iterator
 
 DIR = os.path.dirname(os.path.abspath(__file__))
 SETTINGS_FILE = os.path.join(DIR, ".claude", "settings.local.json")
+LOCK_FILE = SETTINGS_FILE + ".lock"  # Verrou partagé entre le bot et le CLI
 
 PERMISSION_MODES = {
     "default": "Demande pour chaque outil",
@@ -14,6 +20,20 @@ PERMISSION_MODES = {
     "plan": "Lecture seule (pas de modifications)",
 }
 
+STREAM_MODES = {
+    "edit": "Un message par réponse, édité au fil de l'eau",
+    "messages": "Un nouveau message à chaque ajout",
+}
+
+# Cadence de capture d'auto_read, en secondes (voir polling.py)
+DEFAULT_POLLING = {
+    "fast": 0.15,
+    "slow": 2.0,
+    "idle_timeout": 30,
+    "confirm": 5,
+    "confirm_tool": 8,
+}
+
 PERMISSION_PRESETS = {
     "Édition de fichiers (Edit, Write)": ["Edit", "Write"],
     "Accès web (WebFetch, WebSearch)": ["WebFetch", "WebSearch"],
@@ -27,41 +47,187 @@ DEFAULT_SETTINGS = {
     },
     "telebot": {
         "permission_mode": "default",
+        "stream_mode": "edit",
+        "auto_respond": False,
+        "polling": dict(DEFAULT_POLLING),
     },
 }
 
 
+def _defaults() -> dict:
+    return json.loads(json.dumps(DEFAULT_SETTINGS))
+
+
+class SettingsStore:
+    """Cache du fichier de settings, relu seulement quand son mtime/inode change.
+
+    Les règles allow/deny sont indexées dans des ensembles pour les tests
+    d'appartenance (presets, règles déjà présentes).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: dict = {}
+        self._stamp: tuple[int, int, int] | None = (-1, -1, -1)  # Jamais chargé
+        self.allow: list[str] = []
+        self.allow_set: frozenset[str] = frozenset()
+        self.deny_set: frozenset[str] = frozenset()
+
+    def _stat(self) -> tuple[int, int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def data(self) -> dict:
+        """Settings courants (à ne pas modifier : passer par load_settings)."""
+        stamp = self._stat()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._set(self._read() if stamp else _defaults())
+        return self._data
+
+    def invalidate(self):
+        self._stamp = (-1, -1, -1)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return _defaults()
+        return data if isinstance(data, dict) else _defaults()
+
+    def _set(self, data: dict):
+        self._data = data
+        permissions = data.get("permissions", {})
+        self.allow = list(permissions.get("allow", []))
+        self.allow_set = frozenset(self.allow)
+        self.deny_set = frozenset(permissions.get("deny", []))
+
+
+_store = SettingsStore(SETTINGS_FILE)
+
+
 def load_settings() -> dict:
-    if not os.path.exists(SETTINGS_FILE):
-        return json.loads(json.dumps(DEFAULT_SETTINGS))
+    """Copie modifiable des settings (le cache n'est pas touché)."""
+    return copy.deepcopy(_store.data())
+
+
+@contextlib.contextmanager
+def _locked() -> Iterator[None]:
+    """Verrou exclusif (flock) sur le fichier .lock, entre processus."""
+    os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write(data: dict):
+    """Écriture atomique : fichier temporaire, fsync puis rename."""
+    directory = os.path.dirname(SETTINGS_FILE)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".settings-", suffix=".tmp")
     try:
-        with open(SETTINGS_FILE) as f:
-            return json.load(f)
-    except (json.JSONDecodeError, OSError):
-        return json.loads(json.dumps(DEFAULT_SETTINGS))
+        try:
+            mode = os.stat(SETTINGS_FILE).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        os.fchmod(fd, mode)  # mkstemp crée en 0600
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, SETTINGS_FILE)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    # Rendre le rename durable
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    _store.invalidate()
+
+
+@contextlib.contextmanager
+def transaction() -> Iterator[dict]:
+    """Lecture-modification-écriture sous verrou, en une seule écriture.
+
+    Les settings sont relus sous le verrou (aucune mise à jour concurrente du
+    bot ou du CLI n'est perdue) ; le fichier n'est réécrit que s'ils ont changé,
+    et pas du tout si le bloc lève une exception.
+
+        with transaction() as data:
+            data["telebot"]["permission_mode"] = "plan"
+    """
+    with _locked():
+        _store.invalidate()
+        data = load_settings()
+        before = json.dumps(data, sort_keys=True)
+        yield data
+        if json.dumps(data, sort_keys=True) != before:
+            _write(data)
 
 
 def save_settings(data: dict):
-    os.makedirs(os.path.dirname(SETTINGS_FILE), exist_ok=True)
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+    """Remplace tous les settings (écriture atomique, sous verrou)."""
+    with _locked():
+        _write(data)
 
 
 def get_permission_mode() -> str:
-    data = load_settings()
+    data = _store.data()
     return data.get("telebot", {}).get("permission_mode", "default")
 
 
 def set_permission_mode(mode: str):
-    data = load_settings()
-    data.setdefault("telebot", {})["permission_mode"] = mode
-    save_settings(data)
+    with transaction() as data:
+        data.setdefault("telebot", {})["permission_mode"] = mode
+
+
+def get_stream_mode() -> str:
+    data = _store.data()
+    mode = data.get("telebot", {}).get("stream_mode", "edit")
+    return mode if mode in STREAM_MODES else "edit"
+
+
+def set_stream_mode(mode: str):
+    with transaction() as data:
+        data.setdefault("telebot", {})["stream_mode"] = mode
+
+
+def get_auto_respond() -> bool:
+    """Réponse automatique aux dialogues de permission couverts par les règles (opt-in)."""
+    data = _store.data()
+    return data.get("telebot", {}).get("auto_respond", False) is True
+
+
+def set_auto_respond(enabled: bool):
+    with transaction() as data:
+        data.setdefault("telebot", {})["auto_respond"] = enabled
+
+
+def get_polling() -> dict[str, float]:
+    """Cadence de capture, valeurs invalides remplacées par les défauts."""
+    data = _store.data()
+    custom = data.get("telebot", {}).get("polling", {})
+    polling = dict(DEFAULT_POLLING)
+    for key, value in custom.items() if isinstance(custom, dict) else ():
+        if key in polling and isinstance(value, (int, float)) and value > 0:
+            polling[key] = value
+    return polling
 
 
 def get_allowed() -> list[str]:
-    data = load_settings()
-    return data.get("permissions", {}).get("allow", [])
+    _store.data()
+    return list(_store.allow)
 
 
 def get_user_allowed() -> list[str]:
@@ -74,36 +240,48 @@ def get_bash_rules() -> list[str]:
     return [p for p in get_allowed() if p.startswith("Bash(")]
 
 
+def update_permissions(add: Iterable[str] = (), remove: Iterable[str] = ()):
+    """Ajoute et retire plusieurs règles allow en une seule écriture."""
+    add, remove = list(add), set(remove)
+    _store.data()
+    if _store.allow_set.issuperset(add) and not remove & _store.allow_set:
+        return  # Rien à changer : ni verrou ni écriture
+    with transaction() as data:
+        allow = data.setdefault("permissions", {}).setdefault("allow", [])
+        present = set(allow)
+        allow[:] = [r for r in allow if r not in remove]
+        allow.extend(r for r in dict.fromkeys(add) if r not in present)
+
+
 def add_permission(rule: str):
-    data = load_settings()
-    allow = data.setdefault("permissions", {}).setdefault("allow", [])
-    if rule not in allow:
-        allow.append(rule)
-    save_settings(data)
+    update_permissions(add=[rule])
 
 
 def remove_permission(rule: str):
-    data = load_settings()
-    allow = data.get("permissions", {}).get("allow", [])
-    if rule in allow:
-        allow.remove(rule)
-        save_settings(data)
+    update_permissions(remove=[rule])
+
+
+def get_permission_rules() -> tuple[frozenset[str], frozenset[str]]:
+    """Règles allow et deny ; mêmes objets tant que le fichier ne change pas."""
+    _store.data()
+    return _store.allow_set, _store.deny_set
+
+
+def is_allowed(rule: str) -> bool:
+    _store.data()
+    return rule in _store.allow_set
 
 
 def is_preset_enabled(preset_rules: list[str]) -> bool:
-    allowed = get_allowed()
-    return all(r in allowed for r in preset_rules)
+    _store.data()
+    return _store.allow_set.issuperset(preset_rules)
 
 
 def toggle_preset(preset_rules: list[str], enable: bool):
-    data = load_settings()
-    allow = data.setdefault("permissions", {}).setdefault("allow", [])
-    for rule in preset_rules:
-        if enable and rule not in allow:
-            allow.append(rule)
-        elif not enable and rule in allow:
-            allow.remove(rule)
-    save_settings(data)
+    if enable:
+        update_permissions(add=preset_rules)
+    else:
+        update_permissions(remove=preset_rules)
 
 
 def get_claude_flags() -> str:
@@ -115,4 +293,4 @@ def get_claude_flags() -> str:
 
 
 def reset_to_defaults():
-    save_settings(json.loads(json.dumps(DEFAULT_SETTINGS)))
+    save_settings(_defaults())
@@ -0,0 +1,386 @@
+"""Terminaux dans lesquels tourne Claude : interface commune et implémentations.
+
+- TmuxBackend : session tmux, pilotée par un client tmux -C persistant
+- PtyBackend : Claude lancé directement sur un pseudo-terminal du bot, sortie
+  interprétée par un écran virtuel en mémoire (sans tmux ni processus par lecture)
+- MemoryBackend : écran en mémoire, alimenté par le code appelant (tests de
+  charge du lecteur et des handlers sans tmux, rejeu d'enregistrements)
+
+Le type par défaut se choisit avec TERMINAL_BACKEND dans .env (tmux ou pty).
+"""
+
+import asyncio
+import codecs
+import fcntl
+import logging
+import os
+import shlex
+import signal
+import struct
+import termios
+import uuid
+from abc import ABC, abstractmethod
+
+import terminal_cmd
+import tmux_control
+import vt_screen
+
+logger = logging.getLogger(__name__)
+
+
+class TerminalBackend(ABC):
+    """Un terminal nommé : création, capture de l'écran, envoi de touches."""
+
+    kind = ""
+    debounce = 0.05  # Délai après un réveil : regroupe les rafales de sortie
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    async def create(self, cwd: str, command: str):
+        """Crée le terminal dans cwd et y lance command."""
+
+    @abstractmethod
+    async def exists(self) -> bool: ...
+
+    @abstractmethod
+    async def capture(self) -> str:
+        """Historique récent et écran visible, en texte ("" si indisponible)."""
+
+    @abstractmethod
+    async def send_keys(self, *keys: str, literal: bool = False):
+        """Envoie des touches nommées (Enter, Escape, Down…) ou du texte littéral."""
+
+    @abstractmethod
+    async def paste(self, text: str):
+        """Colle un texte (multiligne) d'un bloc, sans le valider."""
+
+    @abstractmethod
+    async def wait_output(self, timeout: float) -> bool:
+        """Attend une nouvelle sortie (True) ou l'expiration du délai (False)."""
+
+    def fingerprint(self, output: str) -> int:
+        """Empreinte de la dernière capture (identique ⇒ écran inchangé)."""
+        return hash(output)
+
+    async def close(self):
+        """Libère les ressources du bot ; le terminal continue de tourner."""
+
+    @abstractmethod
+    async def kill(self):
+        """Termine le terminal et le programme qui y tourne."""
+
+
+class TmuxBackend(TerminalBackend):
+    kind = "tmux"
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.control: tmux_control.TmuxControl | None = None  # Client tmux -C
+
+    async def get_control(self) -> tmux_control.TmuxControl:
+        """Retourne le client tmux -C attaché à la session, (re)connecté si nécessaire."""
+        if self.control is None or not self.control.alive:
+            self.control = tmux_control.TmuxControl(self.name)
+            await self.control.connect()
+        return self.control
+
+    async def create(self, cwd: str, command: str):
+        await terminal_cmd.new_session(self.name, cwd)
+        await self.send_keys(command, literal=True)
+        await self.send_keys("Enter")
+
+    async def exists(self) -> bool:
+        # Le client tmux -C reçoit %exit à la fermeture de la session
+        if self.control is not None and self.control.alive:
+            return True
+        return await terminal_cmd.has_session(self.name)
+
+    async def capture(self) -> str:
+        """Capture les 2000 dernières lignes du terminal (seul le delta est relu)."""
+        try:
+            return await (await self.get_control()).buffer.capture()
+        except tmux_control.TmuxControlError:
+            return ""
+
+    async def send_keys(self, *keys: str, literal: bool = False):
+        try:
+            await (await self.get_control()).send_keys(*keys, literal=literal)
+        except tmux_control.TmuxControlError:
+            pass
+
+    async def paste(self, text: str):
+        """Buffer tmux temporaire collé en bracketed paste (-p), puis supprimé (-d)."""
+        try:
+            control = await self.get_control()
+            buffer = f"telebot-{uuid.uuid4().hex[:8]}"
+            await control.commands(
+                f"set-buffer -b {buffer} {tmux_control.quote(text)}",
+                f"paste-buffer -p -d -b {buffer} -t {control.target}",
+            )
+        except tmux_control.TmuxControlError:
+            pass
+
+    async def wait_output(self, timeout: float) -> bool:
+        try:
+            control = await self.get_control()
+        except tmux_control.TmuxControlError:
+            await asyncio.sleep(timeout)
+            return False
+        return await control.wait_output(timeout)
+
+    def fingerprint(self, output: str) -> int:
+        """Fournie par le buffer tmux (history_size + écran), sinon hash de la capture."""
+        if self.control is not None and self.control.alive:
+            return self.control.buffer.fingerprint
+        return hash(output)
+
+    async def close(self):
+        if self.control is not None:
+            await self.control.close()
+            self.control = None
+
+    async def kill(self):
+        await self.close()
+        await terminal_cmd.kill_session(self.name)
+
+
+class MemoryBackend(TerminalBackend):
+    """Terminal simulé : l'écran est fourni par `show()`, les touches sont notées."""
+
+    kind = "memory"
+    debounce = 0.0  # Écrans fournis d'un bloc : rien à regrouper
+
+    def __init__(self, name: str, screen: str = ""):
+        super().__init__(name)
+        self.screen = screen
+        self.alive = False
+        self.keys: list[str] = []  # Touches et textes reçus, dans l'ordre
+        self.captures = 0
+        self._output = asyncio.Event()
+
+    def show(self, screen: str):
+        """Remplace l'écran et réveille les lecteurs en attente de sortie."""
+        self.screen = screen
+        self._output.set()
+
+    async def create(self, cwd: str, command: str):
+        self.alive = True
+        self.keys.append(command)
+
+    async def exists(self) -> bool:
+        return self.alive
+
+    async def capture(self) -> str:
+        self.captures += 1
+        return self.screen if self.alive else ""
+
+    async def send_keys(self, *keys: str, literal: bool = False):
+        self.keys.extend(keys)
+
+    async def paste(self, text: str):
+        self.keys.append(text)
+
+    async def wait_output(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._output.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._output.clear()
+        return True
+
+    async def kill(self):
+        self.alive = False
+        self._output.set()
+
+
+# Touches nommées (noms tmux) → séquences envoyées au PTY
+_KEYS = {
+    "Enter": "\r",
+    "Escape": "\x1b",
+    "Tab": "\t",
+    "BTab": "\x1b[Z",
+    "BSpace": "\x7f",
+    "Space": " ",
+    "Up": "\x1b[A",
+    "Down": "\x1b[B",
+    "Right": "\x1b[C",
+    "Left": "\x1b[D",
+    "C-c": "\x03",
+    "C-d": "\x04",
+}
+
+
+class PtyBackend(TerminalBackend):
+    """Claude sur un pseudo-terminal dont le maître est lu par la boucle asyncio.
+
+    Chaque lecture du PTY alimente l'écran virtuel : une capture ne coûte ni
+    processus ni aller-retour, et les lecteurs sont réveillés dès la sortie.
+    Le terminal appartient au bot : il ne survit pas à son redémarrage.
+    """
+
+    kind = "pty"
+
+    def __init__(self, name: str, width: int = 200, height: int = 50):
+        super().__init__(name)
+        self._proc: asyncio.subprocess.Process | None = None
+        self._fd: int | None = None  # Côté maître du PTY
+        self._reset(width, height)
+
+    def _reset(self, width: int, height: int):
+        """Écran, décodeur et notification neufs (session recréée à l'identique)."""
+        self.screen = vt_screen.VirtualScreen(width, height)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._output = asyncio.Event()
+        self._text = ""
+        self._text_version = -1
+        self._pending = bytearray()  # Octets pas encore acceptés par le PTY
+
+    async def create(self, cwd: str, command: str):
+        self._reset(self.screen.width, self.screen.height)
+        master, slave = os.openpty()
+        winsize = struct.pack("HHHH", self.screen.height, self.screen.width, 0, 0)
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, winsize)
+        env = dict(os.environ, TERM="xterm-256color")
+        try:
+            self._proc = await asyncio.create_subprocess_exec(
+                *shlex.split(command),
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                cwd=cwd,
+                env=env,
+                start_new_session=True,
+                preexec_fn=_set_controlling_tty,
+            )
+        except OSError:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        os.set_blocking(master, False)
+        self._fd = master
+        asyncio.get_running_loop().add_reader(master, self._on_readable)
+
+    def _on_readable(self):
+        assert self._fd is not None
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""  # EIO : le programme a fermé le terminal
+        if not data:
+            self._detach()
+        else:
+            self.screen.feed(self._decoder.decode(data))
+            if self.screen.replies:
+                # Requêtes de l'application (position du curseur…) : répondre
+                replies, self.screen.replies = self.screen.replies, []
+                self._write("".join(replies).encode())
+        self._output.set()
+
+    def _detach(self):
+        if self._fd is not None:
+            loop = asyncio.get_running_loop()
+            loop.remove_reader(self._fd)
+            loop.remove_writer(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        self._pending.clear()
+
+    def _write(self, data: bytes):
+        if self._fd is None:
+            return
+        # Tampon d'entrée du PTY limité (~4 Ko) : le reste est écrit quand le
+        # programme a lu, sans jamais bloquer la boucle
+        queued = bool(self._pending)
+        self._pending += data
+        if not queued:
+            self._flush()
+
+    def _flush(self):
+        assert self._fd is not None
+        try:
+            while self._pending:
+                del self._pending[: os.write(self._fd, self._pending)]
+        except BlockingIOError:
+            asyncio.get_running_loop().add_writer(self._fd, self._flush)
+            return
+        except OSError:
+            self._pending.clear()  # Terminal fermé : _on_readable détachera
+        asyncio.get_running_loop().remove_writer(self._fd)
+
+    async def exists(self) -> bool:
+        return (
+            self._fd is not None
+            and self._proc is not None
+            and (self._proc.returncode is None)
+        )
+
+    async def capture(self) -> str:
+        if self.screen.version != self._text_version:
+            self._text = self.screen.text()
+            self._text_version = self.screen.version
+        return self._text
+
+    async def send_keys(self, *keys: str, literal: bool = False):
+        if literal:
+            self._write("".join(keys).encode())
+        else:
+            self._write("".join(_KEYS.get(k, k) for k in keys).encode())
+
+    async def paste(self, text: str):
+        if self.screen.bracketed_paste:
+            text = f"\x1b[200~{text}\x1b[201~"
+        self._write(text.encode())
+
+    async def wait_output(self, timeout: float) -> bool:
+        if self._fd is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._output.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._output.clear()
+        return True
+
+    def fingerprint(self, output: str) -> int:
+        return self.screen.fingerprint()
+
+    async def kill(self):
+        proc = self._proc
+        if proc is not None and proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGHUP)
+                await asyncio.wait_for(proc.wait(), 2)
+            except ProcessLookupError:
+                pass
+            except asyncio.TimeoutError:
+                os.killpg(proc.pid, signal.SIGKILL)
+                await proc.wait()
+        self._detach()
+
+
+def _set_controlling_tty():
+    """Dans le processus enfant (après setsid) : le PTY devient son terminal de contrôle."""
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+
+BACKENDS: dict[str, type[TerminalBackend]] = {
+    TmuxBackend.kind: TmuxBackend,
+    PtyBackend.kind: PtyBackend,
+    MemoryBackend.kind: MemoryBackend,
+}
+DEFAULT_BACKEND = TmuxBackend.kind
+
+
+def open_backend(name: str, kind: str | None = None) -> TerminalBackend:
+    """Terminal `name` du type demandé, sinon TERMINAL_BACKEND (tmux par défaut)."""
+    kind = kind or os.environ.get("TERMINAL_BACKEND") or DEFAULT_BACKEND
+    if kind not in BACKENDS:
+        logger.warning("TERMINAL_BACKEND inconnu : %r, tmux utilisé", kind)
+        kind = DEFAULT_BACKEND
+    return BACKENDS[kind](name)
@@ -0,0 +1,108 @@
+"""Commandes terminal asynchrones, sans shell (argv + create_subprocess_exec).
+
+Chaque appel a son propre délai et le nombre de processus simultanés est borné,
+pour ne jamais bloquer la boucle asyncio du bot pendant que tmux répond.
+"""
+
+import asyncio
+import weakref
+from typing import NamedTuple
+
+DEFAULT_TIMEOUT = 5  # Secondes max par commande
+MAX_CONCURRENT = 4  # Processus simultanés max
+SESSION_PREFIX = "claude-"  # Sessions du bot : claude-<user_id>
+LEGACY_SESSION = "claude"  # Session unique des versions précédentes
+
+# Un sémaphore par boucle (le CLI enchaîne plusieurs asyncio.run)
+_semaphores: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"
+) = weakref.WeakKeyDictionary()
+
+
+class CommandResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENT)
+    return sem
+
+
+async def run(*argv: str, timeout: float = DEFAULT_TIMEOUT) -> CommandResult:
+    """Lance argv sans shell et attend sa fin (processus tué au-delà du délai)."""
+    async with _semaphore():
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:
+            return CommandResult(127, "", str(e))
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return CommandResult(-1, "", f"{argv[0]} : délai dépassé ({timeout}s)")
+        return CommandResult(
+            proc.returncode or 0,
+            out.decode(errors="replace"),
+            err.decode(errors="replace"),
+        )
+
+
+def run_sync(coro):
+    """Exécute une coroutine de ce module depuis du code synchrone (CLI)."""
+    return asyncio.run(coro)
+
+
+# --- tmux ---
+
+
+async def tmux(*args: str, timeout: float = DEFAULT_TIMEOUT) -> CommandResult:
+    return await run("tmux", *args, timeout=timeout)
+
+
+async def has_session(name: str) -> bool:
+    return (await tmux("has-session", "-t", f"={name}")).ok
+
+
+async def new_session(
+    name: str, cwd: str, width: int = 200, height: int = 50
+) -> CommandResult:
+    return await tmux(
+        "new-session", "-d", "-s", name, "-x", str(width), "-y", str(height), "-c", cwd
+    )
+
+
+async def kill_session(name: str) -> CommandResult:
+    return await tmux("kill-session", "-t", f"={name}")
+
+
+async def list_sessions(prefix: str = "") -> list[str]:
+    """Noms des sessions tmux commençant par prefix."""
+    result = await tmux("list-sessions", "-F", "#{session_name}")
+    if not result.ok:
+        return []
+    return [n for n in result.stdout.splitlines() if n.startswith(prefix)]
+
+
+def is_bot_session(name: str) -> bool:
+    """Session ouverte par le bot (claude-<user_id>, ou l'ancienne session claude)."""
+    return name == LEGACY_SESSION or name.startswith(SESSION_PREFIX)
+
+
+async def bot_sessions() -> list[str]:
+    """Sessions tmux ouvertes par le bot, sans les autres sessions claude*."""
+    return [n for n in await list_sessions() if is_bot_session(n)]
@@ -0,0 +1,106 @@
+"""Chronologie de chaque tour (message → réponse), écrite en JSON lines.
+
+Une ligne par tour dans timeline.jsonl : instants (secondes depuis la réception
+de la mise à jour Telegram) des étapes franchies, et issue du tour.
+`telebot stats` en tire les percentiles de chaque phase.
+"""
+
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+TIMELINE_FILE = os.path.join(DIR, "timeline.jsonl")
+
+# Étapes d'un tour, dans l'ordre
+EVENTS = (
+    "received",  # Mise à jour Telegram reçue
+    "keys_sent",  # Message ou touches envoyés au terminal
+    "first_text",  # Premier texte de Claude détecté à l'écran
+    "first_message",  # Premier message Telegram délivré
+    "dialog",  # Dialogue interactif détecté
+    "done",  # Fin de tour confirmée
+    "end",  # Fin du lecteur auto_read
+)
+
+# Phases rapportées par `telebot stats` : (libellé, étape de début, étape de fin)
+PHASES = (
+    ("Envoi au terminal", "received", "keys_sent"),
+    ("Premier texte (Claude + capture)", "keys_sent", "first_text"),
+    ("Premier message (Telegram)", "first_text", "first_message"),
+    ("Dialogue affiché", "keys_sent", "dialog"),
+    ("Fin de tour confirmée", "keys_sent", "done"),
+    ("Tour complet", "received", "end"),
+)
+
+
+class Turn:
+    """Étapes d'un tour ; seul le premier passage par une étape est retenu."""
+
+    def __init__(self, session: str, trigger: str, path: str | None = TIMELINE_FILE):
+        self.session = session
+        self.trigger = trigger  # message, touche, pick, open, auto
+        self.path = path  # None : tour non enregistré (rejeu, tests)
+        self.started = time.time()
+        self._t0 = time.monotonic()
+        self.events: dict[str, float] = {"received": 0.0}
+
+    def mark(self, event: str, at: float | None = None):
+        """Note une étape (at : instant time.monotonic(), maintenant par défaut)."""
+        if event not in self.events:
+            at = time.monotonic() if at is None else at
+            self.events[event] = round(at - self._t0, 4)
+
+    def finish(self, outcome: str, **extra):
+        """Clôt le tour et l'ajoute au fichier (erreurs d'écriture ignorées)."""
+        self.mark("end")
+        if self.path is None:
+            return
+        record = {
+            "ts": round(self.started, 3),
+            "session": self.session,
+            "trigger": self.trigger,
+            "outcome": outcome,  # done, dialog, timeout, cancelled, joined
+            "events": dict(sorted(self.events.items(), key=lambda e: e[1])),
+            **extra,
+        }
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning("Écriture impossible : %s", e)
+
+
+def load(path: str = TIMELINE_FILE, last: int | None = None) -> list[dict]:
+    """Tours enregistrés (les `last` derniers), lignes illisibles ignorées."""
+    turns = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    turns.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except OSError:
+        return []
+    return turns[-last:] if last else turns
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentile p (0–100) par rang le plus proche ; values doit être trié."""
+    rank = max(1, -(-len(values) * p // 100))  # ceil(n * p / 100)
+    return values[int(rank) - 1]
+
+
+def phase_durations(turns: list[dict]) -> dict[str, list[float]]:
+    """Durées triées de chaque phase, sur les tours qui ont franchi ses deux étapes."""
+    durations: dict[str, list[float]] = {label: [] for label, _, _ in PHASES}
+    for turn in turns:
+        events = turn.get("events", {})
+        for label, start, end in PHASES:
+            if start in events and end in events:
+                durations[label].append(events[end] - events[start])
+    return {label: sorted(values) for label, values in durations.items()}
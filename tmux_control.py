@@ -0,0 +1,297 @@
+"""Client tmux en mode contrôle (tmux -C) : une connexion persistante par session.
+
+Le client reste attaché à la session, reçoit les notifications %output poussées
+par tmux et envoie ses commandes (capture-pane, send-keys…) sur le même canal,
+sans lancer de processus à chaque appel.
+"""
+
+import asyncio
+import collections
+import uuid
+
+import metrics
+
+COMMAND_TIMEOUT = 10  # Secondes max pour une réponse %begin/%end
+_PANE_INFO = "#{history_size} #{pane_width} #{pane_height}"
+_OVERLAP = 4  # Lignes déjà connues relues pour vérifier l'alignement du delta
+
+
+class TmuxControlError(Exception):
+    """Erreur renvoyée par tmux (%error) ou connexion de contrôle fermée."""
+
+
+def quote(arg: str) -> str:
+    """Protège un argument pour le parseur de commandes tmux (guillemets doubles)."""
+    escaped = (
+        arg.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("$", "\\$")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+    return f'"{escaped}"'
+
+
+class TmuxControl:
+    """Connexion tmux -C attachée à une session."""
+
+    def __init__(self, session: str):
+        self.session = session
+        self.target = quote(f"={session}:")  # Correspondance exacte du nom
+        self._proc: asyncio.subprocess.Process | None = None
+        self._reader: asyncio.Task | None = None
+        self._pending: collections.deque[asyncio.Future] = collections.deque()
+        self._block: list[str] | None = None
+        self._block_id: list[str] = []
+        self._block_flags = ""
+        self._sentinel = ""
+        self._ready: asyncio.Future | None = None
+        self._output = asyncio.Event()
+        self._closed = False
+        self.output_seq = 0  # Incrémenté à chaque %output reçu
+        self.buffer = PaneBuffer(self)
+
+    @property
+    def alive(self) -> bool:
+        return (
+            not self._closed
+            and self._proc is not None
+            and self._proc.returncode is None
+        )
+
+    async def connect(self):
+        """Attache le client à la session et attend qu'il soit prêt."""
+        loop = asyncio.get_running_loop()
+        self._proc = await asyncio.create_subprocess_exec(
+            "tmux",
+            "-C",
+            "attach-session",
+            "-t",
+            f"={self.session}",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=1 << 20,
+        )
+        self._reader = asyncio.create_task(self._read_loop())
+        # Les blocs émis à l'attache ne correspondent à aucune de nos commandes :
+        # on les ignore jusqu'à la réponse d'une commande sentinelle.
+        self._sentinel = f"telebot-ready-{uuid.uuid4().hex}"
+        self._ready = loop.create_future()
+        await self._write(f"display-message -p {self._sentinel}")
+        try:
+            await asyncio.wait_for(self._ready, COMMAND_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise TmuxControlError(f"tmux -C : pas de réponse ({self.session})")
+
+    async def close(self):
+        """Détache le client (la session tmux continue de tourner)."""
+        self._closed = True
+        if self._proc and self._proc.returncode is None:
+            if self._proc.stdin and not self._proc.stdin.is_closing():
+                self._proc.stdin.close()
+            try:
+                await asyncio.wait_for(self._proc.wait(), 2)
+            except asyncio.TimeoutError:
+                self._proc.kill()
+        if self._reader and not self._reader.done():
+            self._reader.cancel()
+        self._fail_pending("connexion tmux -C fermée")
+
+    async def command(self, cmd: str, timeout: float = COMMAND_TIMEOUT) -> list[str]:
+        """Envoie une commande tmux et retourne les lignes de sa réponse."""
+        return (await self.commands(cmd, timeout=timeout))[0]
+
+    async def commands(
+        self, *cmds: str, timeout: float = COMMAND_TIMEOUT
+    ) -> list[list[str]]:
+        """Envoie plusieurs commandes sur une seule ligne (exécution atomique côté tmux).
+
+        tmux les exécute à la suite sans lire la sortie du pane entre elles,
+        et répond par un bloc %begin/%end par commande.
+        """
+        if not self.alive:
+            raise TmuxControlError("connexion tmux -C fermée")
+        loop = asyncio.get_running_loop()
+        futs = [loop.create_future() for _ in cmds]
+        self._pending.extend(futs)
+        await self._write(" ; ".join(cmds))
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.gather(*futs)), timeout
+            )
+        except asyncio.TimeoutError:
+            # Les futurs restent dans la file : la réponse tardive les consommera
+            metrics.TIMEOUTS.inc(source="tmux")
+            raise TmuxControlError(f"tmux -C : délai dépassé ({cmds[0].split()[0]})")
+
+    async def capture(self, start: int = -2000) -> str:
+        """Équivalent de `tmux capture-pane -p -S <start>` sur la session."""
+        lines = await self.command(f"capture-pane -p -t {self.target} -S {start}")
+        return "\n".join(lines).strip()
+
+    async def send_keys(self, *keys: str, literal: bool = False):
+        """Équivalent de `tmux send-keys [-l] <keys…>` sur la session."""
+        flag = " -l" if literal else ""
+        args = " ".join(quote(k) for k in keys)
+        await self.command(f"send-keys -t {self.target}{flag} {args}")
+
+    async def wait_output(self, timeout: float) -> bool:
+        """Attend une notification %output (True) ou l'expiration du délai (False)."""
+        if not self.alive:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._output.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._output.clear()
+        return True
+
+    async def _write(self, cmd: str):
+        assert self._proc and self._proc.stdin
+        try:
+            self._proc.stdin.write(cmd.encode() + b"\n")
+            await self._proc.stdin.drain()
+        except (ConnectionError, RuntimeError) as e:
+            self._closed = True
+            raise TmuxControlError(f"connexion tmux -C fermée : {e}") from e
+
+    async def _read_loop(self):
+        assert self._proc and self._proc.stdout
+        try:
+            while True:
+                raw = await self._proc.stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors="replace").rstrip("\n")
+                if self._block is not None:
+                    # Fin de bloc : même horodatage et numéro de commande que %begin
+                    if (
+                        line.startswith(("%end ", "%error "))
+                        and line.split()[1:3] == self._block_id
+                    ):
+                        self._finish_block(line.startswith("%error "))
+                    else:
+                        self._block.append(line)
+                    continue
+                if line.startswith("%begin "):
+                    parts = line.split()
+                    self._block = []
+                    self._block_id = parts[1:3]
+                    self._block_flags = parts[3] if len(parts) > 3 else ""
+                elif line.startswith(("%output ", "%extended-output ")):
+                    self.output_seq += 1
+                    self._output.set()
+                elif line.startswith("%exit"):
+                    break
+        finally:
+            self._closed = True
+            self._output.set()  # Réveiller les lecteurs en attente
+            self._fail_pending("session tmux terminée")
+
+    def _finish_block(self, is_error: bool):
+        lines = self._block or []
+        self._block = None
+        if self._ready is not None and not self._ready.done():
+            if self._sentinel in lines:
+                self._ready.set_result(None)
+            return
+        # Flag 1 = réponse à une commande envoyée par ce client
+        if self._block_flags != "1" or not self._pending:
+            return
+        fut = self._pending.popleft()
+        if fut.done():
+            return
+        if is_error:
+            fut.set_exception(TmuxControlError("\n".join(lines)))
+        else:
+            fut.set_result(lines)
+
+    def _fail_pending(self, reason: str):
+        if self._ready is not None and not self._ready.done():
+            self._ready.set_exception(TmuxControlError(reason))
+        while self._pending:
+            fut = self._pending.popleft()
+            if not fut.done():
+                fut.set_exception(TmuxControlError(reason))
+
+
+class PaneBuffer:
+    """Copie en mémoire du pane (historique + écran), mise à jour par deltas.
+
+    Entre deux captures, `#{history_size}` indique combien de lignes ont défilé
+    dans l'historique : seules ces lignes et l'écran visible sont relus, le reste
+    de l'historique (immuable) est conservé en mémoire.
+    """
+
+    def __init__(self, control: TmuxControl, history: int = 2000):
+        self._control = control
+        self.history = history
+        self._lines: list[str] = []
+        self._history_size = -1
+        self._size = (0, 0)
+        self._seq = -1
+        self.fingerprint = 0  # Empreinte de la frame (history_size + écran visible)
+
+    def reset(self):
+        self._lines = []
+        self._history_size = -1
+
+    async def capture(self) -> str:
+        """Équivalent de `capture-pane -p -S -<history>`, en ne relisant que le delta."""
+        control = self._control
+        target = control.target
+        seq = control.output_seq
+        if self._lines and seq == self._seq:
+            # Aucune sortie poussée par tmux depuis la dernière frame
+            return self.text()
+        info = await control.command(f"display-message -p -t {target} '{_PANE_INFO}'")
+        history_size, width, height = (int(x) for x in info[0].split())
+        delta = history_size - self._history_size
+        kept = self._lines[: len(self._lines) - self._size[1]]
+        overlap = min(_OVERLAP, len(kept))
+        if (
+            not self._lines
+            or delta < 0  # Historique effacé ou purgé (history-limit atteint)
+            or delta > self.history
+            or (width, height) != self._size  # Redimensionnement → reflow
+        ):
+            await self._full(target)
+        else:
+            # Lignes défilées depuis la frame précédente + écran visible, en une fois
+            info_now, rows = await control.commands(
+                f"display-message -p -t {target} '{_PANE_INFO}'",
+                f"capture-pane -p -t {target} -S -{delta + overlap}",
+            )
+            metrics.CAPTURE_ROWS.inc(len(rows), mode="delta")
+            if (
+                int(info_now[0].split()[0]) != history_size
+                or rows[:overlap] != kept[len(kept) - overlap :]
+            ):
+                # Défilement entre les deux appels, ou historique purgé puis regarni
+                await self._full(target)
+            else:
+                self._store(kept + rows[overlap:], info_now[0])
+        self._seq = seq
+        return self.text()
+
+    def text(self) -> str:
+        return "\n".join(self._lines).strip()
+
+    async def _full(self, target: str):
+        info, rows = await self._control.commands(
+            f"display-message -p -t {target} '{_PANE_INFO}'",
+            f"capture-pane -p -t {target} -S -{self.history}",
+        )
+        self._store(rows, info[0])
+        metrics.CAPTURE_ROWS.inc(len(rows), mode="full")
+
+    def _store(self, rows: list[str], info: str):
+        history_size, width, height = (int(x) for x in info.split())
+        self._history_size = history_size
+        self._size = (width, height)
+        self._lines = rows[-(self.history + height) :]
+        # L'historique est immuable : l'écran visible suffit à identifier la frame
+        self.fingerprint = hash((history_size, *self._lines[-height:]))
@@ -0,0 +1,284 @@
+"""Écran virtuel VT100/xterm minimal, alimenté au fil de l'eau par la sortie d'un PTY.
+
+Couvre ce qu'émet une interface terminal comme Claude Code (Ink) : texte UTF-8,
+CR/LF/BS/TAB, déplacements du curseur, effacements, insertion/suppression de
+lignes et de caractères, zone de défilement, sauvegarde du curseur, écran
+alternatif. Les attributs (couleurs, gras…) sont ignorés : seul le texte compte.
+Les lignes qui sortent par le haut de l'écran rejoignent l'historique.
+"""
+
+import collections
+import unicodedata
+
+_ESC = "\x1b"
+
+
+def _width(ch: str) -> int:
+    if unicodedata.combining(ch):
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+
+
+class VirtualScreen:
+    """Grille de `height` lignes de `width` cellules, plus `history` lignes d'historique."""
+
+    def __init__(self, width: int = 200, height: int = 50, history: int = 2000):
+        self.width = width
+        self.height = height
+        self.history: collections.deque[str] = collections.deque(maxlen=history)
+        self.rows = [self._blank() for _ in range(height)]
+        self.x = self.y = 0
+        self.version = 0  # Incrémenté à chaque morceau de sortie interprété
+        self.scrolled = 0  # Lignes passées dans l'historique depuis le début
+        self.bracketed_paste = False  # Mode ?2004 demandé par l'application
+        self.replies: list[str] = []  # Réponses aux requêtes du terminal (DSR, DA)
+        self._top, self._bottom = 0, height - 1  # Zone de défilement
+        self._wrap_pending = False
+        self._saved = (0, 0)
+        self._main: tuple[list[list[str]], int, int] | None = None  # Écran principal
+        self._state = "ground"
+        self._params = ""
+        self._osc_esc = False
+
+    def _blank(self) -> list[str]:
+        return [" "] * self.width
+
+    # --- Lecture ---
+
+    def lines(self) -> list[str]:
+        """Historique puis écran visible, sans espaces de fin."""
+        return [*self.history, *("".join(row).rstrip() for row in self.rows)]
+
+    def text(self) -> str:
+        return "\n".join(self.lines()).strip()
+
+    def fingerprint(self) -> int:
+        """Empreinte du contenu : l'historique ne fait que croître, l'écran suffit."""
+        return hash((self.scrolled, *("".join(row) for row in self.rows)))
+
+    # --- Alimentation ---
+
+    def feed(self, data: str):
+        """Interprète un morceau de sortie (peut couper une séquence en deux)."""
+        for ch in data:
+            state = self._state
+            if state == "ground":
+                if ch >= " " and ch != "\x7f":
+                    self._put(ch)
+                elif ch == _ESC:
+                    self._state = "escape"
+                else:
+                    self._control(ch)
+            elif state == "escape":
+                self._escape(ch)
+            elif state == "csi":
+                if "0" <= ch <= "?" or " " <= ch <= "/":
+                    self._params += ch  # Paramètres et intermédiaires
+                else:
+                    self._state = "ground"
+                    self._csi(ch, self._params)
+            elif state == "osc":
+                # Titre de fenêtre, hyperliens… : ignoré jusqu'à BEL ou ST (ESC \)
+                if ch == "\x07" or (self._osc_esc and ch == "\\"):
+                    self._state = "ground"
+                self._osc_esc = ch == _ESC
+            elif state == "charset":
+                self._state = "ground"  # ESC ( B… : jeu de caractères ignoré
+        self.version += 1
+
+    def _control(self, ch: str):
+        if ch == "\r":
+            self.x = 0
+            self._wrap_pending = False
+        elif ch in "\n\x0b\x0c":
+            self._linefeed()
+        elif ch == "\b":
+            self.x = max(0, self.x - 1)
+            self._wrap_pending = False
+        elif ch == "\t":
+            self.x = min(self.width - 1, (self.x // 8 + 1) * 8)
+
+    def _escape(self, ch: str):
+        self._state = "ground"
+        if ch == "[":
+            self._state = "csi"
+            self._params = ""
+        elif ch == "]":
+            self._state = "osc"
+            self._osc_esc = False
+        elif ch in "()*+":
+            self._state = "charset"
+        elif ch == "7":
+            self._saved = (self.x, self.y)
+        elif ch == "8":
+            self.x, self.y = self._saved
+        elif ch == "D":
+            self._linefeed()
+        elif ch == "E":
+            self.x = 0
+            self._linefeed()
+        elif ch == "M":
+            if self.y == self._top:
+                self._scroll_down(1)
+            else:
+                self.y = max(0, self.y - 1)
+        elif ch == "c":
+            version, scrolled = self.version, self.scrolled
+            self.__init__(self.width, self.height, self.history.maxlen or 0)
+            self.version, self.scrolled = version, scrolled
+
+    def _csi(self, final: str, raw: str):
+        args = [int(p) if p.isdigit() else 0 for p in raw.lstrip("?<=>").split(";")]
+        n = max(1, args[0])
+        self._wrap_pending = False
+        if raw[:1] in ("?", "<", "=", ">"):
+            # Modes privés (DEC, clavier kitty…) : seuls ?h/?l nous concernent
+            if raw[0] == "?" and final in "hl":
+                self._private_mode(args, final == "h")
+            return
+        if final == "A":
+            self.y = max(self._top if self.y >= self._top else 0, self.y - n)
+        elif final in "Be":
+            self.y = min(
+                self._bottom if self.y <= self._bottom else self.height - 1, self.y + n
+            )
+        elif final in "Ca":
+            self.x = min(self.width - 1, self.x + n)
+        elif final == "D":
+            self.x = max(0, self.x - n)
+        elif final == "E":
+            self.x, self.y = 0, min(self.height - 1, self.y + n)
+        elif final == "F":
+            self.x, self.y = 0, max(0, self.y - n)
+        elif final in "G`":
+            self.x = min(self.width - 1, n - 1)
+        elif final == "d":
+            self.y = min(self.height - 1, n - 1)
+        elif final in "Hf":
+            col = max(1, args[1]) if len(args) > 1 else 1
+            self.y = min(self.height - 1, n - 1)
+            self.x = min(self.width - 1, col - 1)
+        elif final == "J":
+            self._erase_display(args[0])
+        elif final == "K":
+            self._erase_line(args[0])
+        elif final == "L":
+            self._insert_lines(n)
+        elif final == "M":
+            self._delete_lines(n)
+        elif final == "P":
+            row = self.rows[self.y]
+            del row[self.x : self.x + n]
+            row.extend(" " * (self.width - len(row)))
+        elif final == "@":
+            row = self.rows[self.y]
+            row[self.x : self.x] = [" "] * n
+            del row[self.width :]
+        elif final == "X":
+            row = self.rows[self.y]
+            end = min(self.width, self.x + n)
+            row[self.x : end] = [" "] * (end - self.x)
+        elif final == "S":
+            self._scroll_up(n)
+        elif final == "T":
+            self._scroll_down(n)
+        elif final == "r":
+            top = max(1, args[0])
+            bottom = args[1] if len(args) > 1 and args[1] else self.height
+            if top < bottom <= self.height:
+                self._top, self._bottom = top - 1, bottom - 1
+                self.x = self.y = 0
+        elif final == "s":
+            self._saved = (self.x, self.y)
+        elif final == "u":
+            self.x, self.y = self._saved
+        elif final == "n" and args[0] == 6:
+            self.replies.append(f"{_ESC}[{self.y + 1};{self.x + 1}R")
+        elif final == "c":
+            self.replies.append(f"{_ESC}[?1;2c")
+
+    def _private_mode(self, modes: list[int], enable: bool):
+        for mode in modes:
+            if mode == 2004:
+                self.bracketed_paste = enable
+            elif mode in (47, 1047, 1049):
+                if enable and self._main is None:
+                    self._main = (self.rows, self.x, self.y)
+                    self.rows = [self._blank() for _ in range(self.height)]
+                elif not enable and self._main is not None:
+                    self.rows, self.x, self.y = self._main
+                    self._main = None
+
+    # --- Écriture ---
+
+    def _put(self, ch: str):
+        width = _width(ch)
+        if width == 0:
+            return  # Diacritique combinant : ignoré (le caractère de base suffit)
+        if self._wrap_pending or self.x + width > self.width:
+            self.x = 0
+            self._linefeed()
+        row = self.rows[self.y]
+        row[self.x] = ch
+        if width == 2:
+            row[self.x + 1] = ""  # Seconde moitié d'un caractère large
+        if self.x + width >= self.width:
+            self.x = self.width - 1
+            self._wrap_pending = True
+        else:
+            self.x += width
+
+    def _linefeed(self):
+        self._wrap_pending = False
+        if self.y == self._bottom:
+            self._scroll_up(1)
+        elif self.y < self.height - 1:
+            self.y += 1
+
+    def _scroll_up(self, n: int):
+        for _ in range(min(n, self._bottom - self._top + 1)):
+            row = self.rows.pop(self._top)
+            if self._top == 0 and self._main is None:
+                self.history.append("".join(row).rstrip())
+                self.scrolled += 1
+            self.rows.insert(self._bottom, self._blank())
+
+    def _scroll_down(self, n: int):
+        for _ in range(min(n, self._bottom - self._top + 1)):
+            self.rows.pop(self._bottom)
+            self.rows.insert(self._top, self._blank())
+
+    def _insert_lines(self, n: int):
+        if self._top <= self.y <= self._bottom:
+            for _ in range(min(n, self._bottom - self.y + 1)):
+                self.rows.pop(self._bottom)
+                self.rows.insert(self.y, self._blank())
+
+    def _delete_lines(self, n: int):
+        if self._top <= self.y <= self._bottom:
+            for _ in range(min(n, self._bottom - self.y + 1)):
+                self.rows.pop(self.y)
+                self.rows.insert(self._bottom, self._blank())
+
+    def _erase_display(self, mode: int):
+        if mode == 0:
+            self._erase_line(0)
+            for y in range(self.y + 1, self.height):
+                self.rows[y] = self._blank()
+        elif mode == 1:
+            self._erase_line(1)
+            for y in range(self.y):
+                self.rows[y] = self._blank()
+        elif mode in (2, 3):
+            self.rows = [self._blank() for _ in range(self.height)]
+            if mode == 3:
+                self.history.clear()
+
+    def _erase_line(self, mode: int):
+        row = self.rows[self.y]
+        if mode == 0:
+            row[self.x :] = [" "] * (self.width - self.x)
+        elif mode == 1:
+            row[: self.x + 1] = [" "] * (self.x + 1)
+        else:
+            self.rows[self.y] = self._blank()
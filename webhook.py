@@ -0,0 +1,138 @@
+"""Réception des mises à jour Telegram par webhook (optionnel, au lieu du long polling).
+
+Activé par WEBHOOK_URL dans .env (`telebot config` ou `telebot start --webhook`) :
+    WEBHOOK_URL=https://bot.example.com/telebot   # URL publique (HTTPS)
+    WEBHOOK_PORT=8080                             # Écoute locale derrière le proxy
+    WEBHOOK_LISTEN=127.0.0.1
+    WEBHOOK_SECRET=...                            # Généré par `telebot config`
+Telegram envoie chaque mise à jour en POST sur l'URL publique ; un reverse
+proxy (nginx, caddy…) la transmet à l'écoute locale, qui vérifie l'en-tête
+X-Telegram-Bot-Api-Secret-Token avant de la passer au bot.
+TELEGRAM_API_URL permet de viser une fausse Bot API locale pour les tests.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY = 1024 * 1024  # Une mise à jour Telegram fait quelques Ko
+DEFAULT_PORT = 8080
+DEFAULT_LISTEN = "127.0.0.1"
+
+
+@dataclass
+class WebhookConfig:
+    url: str  # URL publique déclarée à Telegram (setWebhook)
+    secret: str
+    port: int = DEFAULT_PORT
+    listen: str = DEFAULT_LISTEN
+
+    @property
+    def path(self) -> str:
+        """Chemin attendu par l'écoute locale : celui de l'URL publique."""
+        return urlparse(self.url).path or "/"
+
+    @classmethod
+    def from_env(cls) -> "WebhookConfig | None":
+        """Configuration lue dans l'environnement (None si incomplète)."""
+        url = os.getenv("WEBHOOK_URL", "").strip()
+        secret = os.getenv("WEBHOOK_SECRET", "").strip()
+        port = os.getenv("WEBHOOK_PORT", "").strip() or str(DEFAULT_PORT)
+        if not url:
+            print("Webhook : WEBHOOK_URL manquant")
+            return None
+        if not secret:
+            print("Webhook : WEBHOOK_SECRET manquant (telebot config)")
+            return None
+        if not port.isdigit():
+            print(f"WEBHOOK_PORT invalide : {port!r}")
+            return None
+        listen = os.getenv("WEBHOOK_LISTEN", "").strip() or DEFAULT_LISTEN
+        return cls(url, secret, int(port), listen)
+
+
+def _response(writer: asyncio.StreamWriter, status: str, body: bytes = b""):
+    writer.write(
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode() + body
+    )
+
+
+async def _read_request(
+    reader: asyncio.StreamReader,
+) -> tuple[str, str, dict[str, str]]:
+    """Ligne de requête et en-têtes (noms en minuscules)."""
+    request = (await reader.readline()).decode(errors="replace").split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode(errors="replace").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    method, target = (request + ["", ""])[:2]
+    return method, target.split("?")[0], headers
+
+
+def _handler(config: WebhookConfig, on_update: Callable[[dict], Awaitable[None]]):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, headers = await asyncio.wait_for(_read_request(reader), 10)
+            if path != config.path:
+                _response(writer, "404 Not Found")
+            elif method != "POST":
+                _response(writer, "405 Method Not Allowed")
+            elif not hmac.compare_digest(
+                headers.get(SECRET_HEADER, "").encode(), config.secret.encode()
+            ):
+                logger.warning("Secret invalide, requête rejetée")
+                _response(writer, "403 Forbidden")
+            elif not headers.get("content-length", "").isdigit():
+                _response(writer, "411 Length Required")
+            elif int(headers["content-length"]) > MAX_BODY:
+                _response(writer, "413 Payload Too Large")
+            else:
+                body = await asyncio.wait_for(
+                    reader.readexactly(int(headers["content-length"])), 10
+                )
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    _response(writer, "400 Bad Request")
+                else:
+                    # Répondre tout de suite : Telegram n'attend pas le traitement
+                    try:
+                        await on_update(data)
+                    except Exception as e:
+                        # Journalisée puis acquittée : renvoyée par Telegram, elle
+                        # échouerait pareil et bloquerait les mises à jour suivantes
+                        logger.exception("Mise à jour ignorée : %r", e)
+                    _response(writer, "200 OK")
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(
+    config: WebhookConfig, on_update: Callable[[dict], Awaitable[None]]
+) -> asyncio.AbstractServer:
+    """Démarre l'écoute locale ; on_update reçoit chaque mise à jour (JSON décodé)."""
+    return await asyncio.start_server(
+        _handler(config, on_update), config.listen, config.port
+    )